@@ -1,59 +1,177 @@
+import argparse
+import atexit
 import logging
 import time
 
 from logging_config import activate_logging_config
 
-from src.Gamemodes import GenericGamemode, EasyMode, MediumMode, HardMode, GamemodeTools
-import RPi.GPIO as GPIO
-import pigpio
+from src.Gamemodes import GenericGamemode, GamemodeTools, ModeManager
+from src.Backend import GPIO, pigpio, mqtt
+from src.Clock import clock
 from src.Hardware import Button
+from src.Events import EventLoop, START, BUTTON
+from src.Inputs import MQTTRouter
+from src.Metrics import metrics
+from src.Recorder import recorder
+from src.Stats import stats, STATS_FILE
+from src.Stations import StationConfig, STATIONS_FILE, load_stations
+from src.Tracing import tracer
+from src.Watchdog import watchdog
+
+GAMELOOP_SECONDS = metrics.histogram("ballongame_gameloop_seconds", "Duration of one run_gameloop call",
+                                     ("station", "mode"))
+EVENT_DELAY = metrics.histogram("ballongame_event_delay_seconds", "Time an event waited in the shared loop",
+                                ("station",))
+
+# Watchdog deadline for one run_gameloop call, which normally takes well under a millisecond
+LOOP_DEADLINE = 0.5
+
+
+class Station:
+    """One balloon with its own modes and mode button, driven by the shared game loop."""
+
+    def __init__(self, pi, config: StationConfig, events: EventLoop, router: MQTTRouter):
+        self.logger = logging.getLogger(config.name)
+        self.config = config
+        self.events = events.channel(self)
+        self.tools = GamemodeTools(pi, station=config, events=self.events, router=router)
+        self.modes = ModeManager(self.tools)
+        self.mode_button = Button(pi, config.mode_button_io)
+        self.tools.buttons.add(self.mode_button, on_press=lambda: self.events.post(BUTTON, "mode"))
+        self._gameloop_seconds = {}
+        self._watch_name = f"{config.name} gameloop"
+
+    @property
+    def mode(self) -> GenericGamemode:
+        return self.modes.current
+
+    def start(self):
+        self.events.post(START)
+        self.tools.set_ready()
+
+    def handle(self, event):
+        if event.kind == BUTTON:
+            self.handle_button(event.data)
+            return
+        mode = self.mode
+        histogram = self._gameloop_seconds.get(mode)
+        if histogram is None:
+            histogram = self._gameloop_seconds[mode] = GAMELOOP_SECONDS.labels(self.config.name, mode.mode)
+        token = watchdog.arm(self._watch_name, LOOP_DEADLINE)
+        start = time.perf_counter()
+        try:
+            mode.run_gameloop(event)
+        finally:
+            watchdog.disarm(token)
+        histogram.observe(time.perf_counter() - start)
+
+    def handle_button(self, name: str):
+        if name == "mode":
+            self.change_mode()
+        else:
+            self.tools.handle_button(name)
+
+    def change_mode(self):
+        # Runs on the game loop thread between events, so the old mode is never mid-step
+        self.modes.next()
 
 
 class Ballongame:
-    def __init__(self):
+    """Runs every configured station from one process.
+
+    All stations share one event loop and one MQTT client. Each station posts
+    and schedules through its own channel, so every event carries the station
+    it belongs to and one thread multiplexes all game loops.
+    """
+
+    def __init__(self, stations: list[StationConfig] = None):
         self.logger = logging.getLogger("Ballongame")
         self.logger.setLevel(logging.DEBUG)
         
         self.logger.info("Initializing Ballongame...")
+        self._started = time.perf_counter()
 
         self.pi = pigpio.pi()
         GPIO.setmode(GPIO.BCM)
 
-        self.tools = GamemodeTools(self.pi)
-        self.mode: GenericGamemode = EasyMode(self.tools)
-        self.mode_button = Button(self.pi, 22)
-        self.mode_button.enable_interrupt(self.change_mode)
+        self.events = EventLoop()
+        self.router = MQTTRouter(mqtt.Client())
+        if stations is None:
+            stations = load_stations()
+        self.stations = [Station(self.pi, config, self.events, self.router) for config in stations]
+        self.router.start()
         self._running = True
-        self._pause = False
-        
+
+    @property
+    def tools(self) -> GamemodeTools:
+        return self.stations[0].tools
+
+    @property
+    def modes(self) -> ModeManager:
+        return self.stations[0].modes
+
+    @property
+    def mode(self) -> GenericGamemode:
+        return self.stations[0].mode
 
     def run(self):
-        self.logger.info("Starting Game Loop!")
-        while self._running:
-            if not self._pause:
-                self.mode.run_gameloop()
+        self.logger.info("Starting Game Loop for %d station(s)!", len(self.stations))
+        for station in self.stations:
+            station.start()
+        self.logger.info("Ready after %.2f s", time.perf_counter() - self._started)
+        delays = {station: EVENT_DELAY.labels(station.config.name) for station in self.stations}
+        try:
+            while self._running:
+                event = self.events.get()  # sleeps until the next input, button press or timer of any station
+                station = event.target
+                if station is None:
+                    continue  # wakeup from stop()
+                delays[station].observe(clock.monotonic() - event.time)
+                station.handle(event)
+        finally:
+            for station in self.stations:  # also on Ctrl+C
+                station.tools.release()
+
+    def stop(self):
+        self._running = False
+        self.events.post(START)
 
     def change_mode(self):
-        if not self.mode.first_cycle:
-            self._pause = True
-            self.mode.cleanup()
-            
-            if isinstance(self.mode, EasyMode):
-                self.mode = MediumMode(self.tools)
-                self.logger.info("Changing Mode to MediumMode!")
-            elif isinstance(self.mode, MediumMode):
-                self.mode = HardMode(self.tools)
-                self.logger.info("Changing Mode to HardMode!")
-            elif isinstance(self.mode, HardMode):
-                self.mode = EasyMode(self.tools)
-                self.logger.info("Changing Mode to EasyMode!")
-                
-            time.sleep(3) # Time for the last loop to finish
-            self._pause = False
+        self.stations[0].change_mode()
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ballongame")
+    parser.add_argument("--metrics-port", type=int, default=9108, help="localhost port for /metrics, 0 disables it")
+    parser.add_argument("--metrics-file", default=None, help="also write the metrics to this Prometheus text file")
+    parser.add_argument("--log-file", default=None, help="also log to this size-rotated file")
+    parser.add_argument("--stations", default=None, help="station config, default stations.json or one station")
+    parser.add_argument("--record", default=None, help="record the session to this file, see Replay.py")
+    parser.add_argument("--stats", default=STATS_FILE, help="SQLite file for the game statistics, see Report.py")
+    parser.add_argument("--no-stats", action="store_true", help="don't keep game statistics")
+    parser.add_argument("--led-process", action="store_true", help="drive the LED strips from separate processes")
+    parser.add_argument("--no-watchdog", action="store_true", help="don't watch the game loop and hardware calls")
+    parser.add_argument("--trace", default=None, help="trace input latency, dumped as Chrome trace JSON on exit")
+    args = parser.parse_args()
+
     print("Starting Script")
-    activate_logging_config()
-    ballongame = Ballongame()
+    activate_logging_config(log_file=args.log_file)
+    if args.metrics_port:
+        try:
+            metrics.serve(args.metrics_port)
+        except OSError as e:
+            logging.getLogger("Ballongame").warning(f"Metrics endpoint not available: {e}")
+    if args.metrics_file:
+        metrics.start_textfile_writer(args.metrics_file)
+    if args.record:
+        recorder.start(args.record)
+    if not args.no_stats:
+        stats.open(args.stats)
+    if not args.no_watchdog:
+        watchdog.start()
+    if args.trace:
+        tracer.enable()
+        atexit.register(tracer.dump, args.trace)
+    stations = load_stations(args.stations or STATIONS_FILE, led_process=args.led_process)
+    ballongame = Ballongame(stations)
     ballongame.run()
@@ -0,0 +1,179 @@
+import os
+
+os.environ["BALLONGAME_BACKEND"] = "sim"
+
+import argparse
+import json
+import logging
+import sys
+import time
+
+from logging_config import activate_logging_config
+from src.Clock import clock, VirtualClock
+from Simulate import run_simulation
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baseline.json")
+
+# Scheduling noise per benchmark in µs, added to the limit so tiny p95s don't fail on jitter
+NOISE_FLOOR_US = {"callback": 1.0, "input_latency": 20.0, "led_set_segment": 1.0, "led_render": 5.0,
+                  "gameloop_easy": 10.0, "gameloop_medium": 10.0, "gameloop_hard": 10.0}
+
+
+def percentiles(samples: list[float]) -> dict:
+    """p50/p95/p99/max of samples given in seconds, reported in microseconds."""
+    ordered = sorted(samples)
+
+    def pick(q: float) -> float:
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1e6
+
+    return {"p50": pick(0.50), "p95": pick(0.95), "p99": pick(0.99), "max": ordered[-1] * 1e6, "n": len(ordered)}
+
+
+def _sim_tools():
+    clock.use(VirtualClock())
+    from src import Simulation
+    from src.Gamemodes import GamemodeTools
+    machine = Simulation.reset_machine()
+    return machine, GamemodeTools(machine.pi)
+
+
+def bench_callback(messages: int = 5000) -> dict:
+    """Cost of GamemodeTools.callback per MQTT message, in the paho network thread on the machine."""
+    from src.Simulation import SimMessage
+    _, tools = _sim_tools()
+    samples = []
+    for i in range(messages):
+        msg = SimMessage(f"Pico{i % 4 + 1}/Eingabe", b"1" if i % 8 < 4 else b"0")
+        start = time.perf_counter()
+        tools.callback(None, None, msg)
+        samples.append(time.perf_counter() - start)
+    return percentiles(samples)
+
+
+def bench_input_latency(presses: int = 200) -> dict:
+    """Real time from a Pico publishing 0 to Pump.open() writing the GPIO, in Easy Mode."""
+    from src.Simulation import SimMQTTClient, PUMP_IO
+    from src.Events import START
+    from src.Gamemodes import EasyMode
+    machine, tools = _sim_tools()
+    mode = EasyMode(tools)
+
+    published = []
+    latencies = []
+    write = machine.pi.write
+
+    def timed_write(io: int, level: int):
+        if io == PUMP_IO and level == 1 and published:
+            latencies.append(time.perf_counter() - published[-1])
+        write(io, level)
+
+    machine.pi.write = timed_write
+
+    def player():
+        client = SimMQTTClient()
+        for _ in range(presses):
+            clock.sleep(3.0)  # longer than one pulse, so every press starts a new one
+            client.publish("Pico1/Eingabe", "1")
+            published.append(time.perf_counter())
+            client.publish("Pico1/Eingabe", "0")
+
+    clock.start_thread(player, "Player1")
+    tools.events.post(START)
+    while len(latencies) < presses:
+        mode.run_gameloop(tools.events.get())
+    return percentiles(latencies)
+
+
+def bench_led(calls: int = 20000) -> dict:
+    """set_segment cost and how many strip transmissions the calls turn into."""
+    machine, tools = _sim_tools()
+    led = tools.led
+    segments = list(led.segments)
+    colors = [(255, 0, 0), (0, 255, 0), (0, 0, 0)]
+    writes_before = machine.strip_writes
+    samples = []
+    for i in range(calls):
+        segment = segments[i % len(segments)]
+        start = time.perf_counter()
+        led.set_segment(segment, colors[(i // 5) % len(colors)])
+        samples.append(time.perf_counter() - start)
+        if i % 100 == 99:
+            clock.sleep(1 / led.fps)  # let the render thread flush a frame
+    result = percentiles(samples)
+    result["calls_per_strip_write"] = calls / max(1, machine.strip_writes - writes_before)
+    return result
+
+
+def bench_led_render(frames: int = 2000) -> dict:
+    """Compositing the whole strip through the brightness table, the per-frame cost of the render thread."""
+    from src.Compositor import color_lut
+    _, tools = _sim_tools()
+    led = tools.led
+    out = bytearray(3 * led.num_leds)
+    luts = [color_lut(0.3), color_lut(0.6)]
+    samples = []
+    for i in range(frames):
+        led.compositor.lut = luts[i % 2]  # every frame changes every lit pixel
+        start = time.perf_counter()
+        led.compositor.render(out, 0, led.num_leds)
+        samples.append(time.perf_counter() - start)
+    return percentiles(samples)
+
+
+def bench_gameloop(mode: str, rounds: int = 3) -> dict:
+    """run_gameloop duration per event, plus CPU time and strip writes per simulated round."""
+    iteration_times = []
+    stats = run_simulation(mode, rounds=rounds, seed=1, iteration_times=iteration_times)
+    result = percentiles(iteration_times)
+    result["cpu_ms_per_round"] = stats["cpu_time"] / max(1, stats["rounds"]) * 1e3
+    result["strip_writes_per_s"] = stats["strip_writes"] / stats["virtual_time"]
+    return result
+
+
+def run_all() -> dict:
+    results = {
+        "callback": bench_callback(),
+        "input_latency": bench_input_latency(),
+        "led_set_segment": bench_led(),
+        "led_render": bench_led_render(),
+    }
+    for mode in ("easy", "medium", "hard"):
+        results[f"gameloop_{mode}"] = bench_gameloop(mode)
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Names every p95 that got slower than baseline * tolerance plus the benchmark's noise floor."""
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        limit = baseline[name]["p95"] * tolerance + NOISE_FLOOR_US.get(name, 1.0)
+        if result["p95"] > limit:
+            regressions.append(f"{name}: p95 {result['p95']:.1f} µs > {limit:.1f} µs")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Latency, LED and game loop benchmarks against simulated hardware.")
+    parser.add_argument("--save-baseline", action="store_true", help=f"store the results in {BASELINE_FILE}")
+    parser.add_argument("--tolerance", type=float, default=1.5, help="allowed p95 slowdown against the baseline")
+    args = parser.parse_args()
+
+    activate_logging_config(logging.WARNING)
+    results = run_all()
+    for name, result in results.items():
+        extra = "  ".join(f"{k} {v:.1f}" for k, v in result.items() if k not in ("p50", "p95", "p99", "max", "n"))
+        print(f"{name:<16} p50 {result['p50']:8.1f} µs  p95 {result['p95']:8.1f} µs  p99 {result['p99']:8.1f} µs  "
+              f"max {result['max']:9.1f} µs  n {result['n']:6d}  {extra}")
+
+    if args.save_baseline:
+        with open(BASELINE_FILE, "w") as file:
+            json.dump(results, file, indent=4)
+        print(f"Baseline saved to {BASELINE_FILE}")
+    elif os.path.exists(BASELINE_FILE):
+        with open(BASELINE_FILE) as file:
+            regressions = compare(results, json.load(file), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        sys.exit(1 if regressions else 0)
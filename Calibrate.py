@@ -0,0 +1,18 @@
+import argparse
+import logging
+
+from logging_config import activate_logging_config
+from src.Backend import pigpio
+from src.Hardware import Pump, ReleaseValve, PressureSensor
+from src.FillModel import calibrate
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inflate one balloon and store its pressure profile.")
+    parser.add_argument("name", nargs="?", default="default", help="profile name, e.g. the balloon type")
+    parser.add_argument("--fill-time", type=float, default=40.0, help="seconds of pumping for a full balloon")
+    args = parser.parse_args()
+
+    activate_logging_config(logging.INFO)
+    pi = pigpio.pi()
+    calibrate(Pump(pi), ReleaseValve(pi), PressureSensor(channel=1), args.name, fill_time=args.fill_time)
@@ -0,0 +1,189 @@
+import os
+
+os.environ["BALLONGAME_BACKEND"] = "sim"
+
+import argparse
+import bisect
+import collections
+import logging
+import tempfile
+import time
+
+from logging_config import activate_logging_config
+from src.Clock import clock, VirtualClock
+from src.Recorder import (recorder, SessionReader, REC_INPUT, REC_PUMP, REC_SERVO, REC_MODE, REC_BUTTON,
+                          REC_PRESSURE, REC_TARGET, BUTTON_CODES)
+
+# Counters a faithful replay reproduces exactly
+CHECKED = ("presses", "pulses", "ejects")
+# The replay runs this much past the end, so actions due right at the end still happen
+GRACE = 0.5
+
+
+def summarize(reader: SessionReader, station: int = 0, eject_angle: float = 120, until: float = None) -> dict:
+    """Pump pulses, pump time, ejects and press-to-pump reaction times of one station, up to until seconds."""
+    pulses = 0
+    pump_time = 0.0
+    ejects = 0
+    presses = 0
+    reactions = []
+    opened_at = None
+    waiting_press = None
+    last_state = {}
+    for rec in reader:
+        if rec.station != station:
+            continue
+        if until is not None and rec.time > until:
+            break
+        if rec.kind == REC_INPUT:
+            if rec.b == ord("0") and last_state.get(rec.a) != ord("0"):
+                presses += 1
+                if waiting_press is None and opened_at is None:
+                    waiting_press = rec.time
+            last_state[rec.a] = rec.b
+        elif rec.kind == REC_PUMP:
+            if rec.value and opened_at is None:
+                opened_at = rec.time
+                pulses += 1
+                if waiting_press is not None:
+                    reactions.append(rec.time - waiting_press)
+                    waiting_press = None
+            elif not rec.value and opened_at is not None:
+                pump_time += rec.time - opened_at
+                opened_at = None
+        elif rec.kind == REC_SERVO and abs(rec.value - eject_angle) < 0.5:
+            ejects += 1
+    reactions.sort()
+    return {
+        "duration": reader.duration if until is None else min(until, reader.duration),
+        "presses": presses,
+        "pulses": pulses,
+        "pump_time": pump_time,
+        "ejects": ejects,
+        "reaction_p50": reactions[len(reactions) // 2] if reactions else float("nan"),
+        "reaction_max": reactions[-1] if reactions else float("nan"),
+    }
+
+
+def replay(path: str, out: str, station: int = 0, speed: float = 100.0, recorded_pressure: bool = False) -> dict:
+    """Feeds the inputs, buttons and mode switches of one recorded station back through the game modes.
+
+    Runs on the virtual clock against the simulated machine, starting in the
+    recorded mode with the recorded balloon profile and showing the recorded
+    targets instead of drawing new ones. speed caps how much faster than the
+    recording the replay may run, 0 runs as fast as possible.
+    """
+    clock.use(VirtualClock())
+
+    from src import Simulation
+    from src.Events import START, BUTTON
+    from src.FillModel import BalloonProfile
+    from src.Gamemodes import GamemodeTools, ModeManager
+
+    source = SessionReader(path)
+    inputs = [rec for rec in source if rec.station == station and rec.kind in (REC_INPUT, REC_MODE, REC_BUTTON)]
+    start_mode = 0
+    if inputs and inputs[0].kind == REC_MODE:
+        start_mode = inputs.pop(0).a
+    targets = collections.deque(rec.a for rec in source if rec.station == station and rec.kind == REC_TARGET)
+    profile = source.profile(station)
+
+    samples = [(rec.time, rec.extra) for rec in source if rec.station == station and rec.kind == REC_PRESSURE]
+    times = [t for t, _ in samples]
+    machine = Simulation.reset_machine()
+    if recorded_pressure:
+        if samples:
+            machine.stations[0].adc_source = lambda: samples[max(0, bisect.bisect_right(times, clock.monotonic()) - 1)][1]
+
+    recorder.start(out)
+    tools = GamemodeTools(machine.pi)
+    tools.wait_ready()
+    if tools.pressure_sensor is not None and len(times) > 1:
+        # Sample at the recorded rate, the averaging window of the fill estimate depends on it
+        intervals = sorted(b - a for a, b in zip(times, times[1:]))
+        Simulation.resample(tools.pressure_sensor, max(1, round(1 / intervals[len(intervals) // 2])))
+    if profile:
+        tools.set_profile(BalloonProfile(**profile))
+    tools.targets = targets
+    modes = ModeManager(tools, index=start_mode)
+    topics = {player: topic for topic, player in tools.input_pipeline.topics.items()}
+    finished = clock.Event()
+
+    def feed():
+        client = Simulation.SimMQTTClient()
+        client.connect("replay")
+        real_start = time.perf_counter()
+        for rec in inputs:
+            clock.sleep(max(0.0, rec.time - clock.monotonic()))
+            if speed:
+                time.sleep(max(0.0, rec.time / speed - (time.perf_counter() - real_start)))
+            if rec.kind == REC_INPUT and rec.a in topics:
+                client.publish(topics[rec.a], bytes([rec.b]))
+            elif rec.kind == REC_MODE:
+                tools.events.post(BUTTON, rec.a)
+            elif rec.kind == REC_BUTTON:
+                tools.events.post(BUTTON, next(name for name, code in BUTTON_CODES.items() if code == rec.a))
+        clock.sleep(max(0.0, source.duration + GRACE - clock.monotonic()))
+        finished.set()
+        tools.events.post(START)  # wake the loop
+
+    clock.start_thread(feed, "Replay")
+    tools.events.post(START)
+    while not finished.is_set():
+        event = tools.events.get()
+        if event.kind == BUTTON:
+            if isinstance(event.data, int):
+                if event.data != modes.index:
+                    modes.switch_to(event.data)
+            else:
+                tools.handle_button(event.data)
+        elif not finished.is_set():
+            modes.run_gameloop(event)
+    recorder.stop()
+    source.close()
+
+    with SessionReader(path) as original, SessionReader(out) as replayed:
+        return {"original": summarize(original, station),
+                "replay": summarize(replayed, 0, until=original.duration + 1e-6)}
+
+
+def mismatches(result: dict) -> list[str]:
+    """The CHECKED counters that differ between the original and the replay."""
+    return [f"{key}: {result['original'][key]:g} -> {result['replay'][key]:g}" for key in CHECKED
+            if result["original"][key] != result["replay"][key]]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay a recorded session against the simulated machine.")
+    parser.add_argument("session", help="session file written by Ballongame.py --record")
+    parser.add_argument("--station", type=int, default=0, help="station number in the recording")
+    parser.add_argument("--speed", type=float, default=100.0, help="maximum speed-up, 0 = unlimited")
+    parser.add_argument("--out", default=None, help="where to record the replay, default a temporary file")
+    parser.add_argument("--recorded-pressure", action="store_true",
+                        help="feed the recorded pressure samples instead of the simulated balloon")
+    parser.add_argument("--dump", action="store_true", help="print the records instead of replaying")
+    parser.add_argument("--check", action="store_true",
+                        help=f"exit with 1 unless {', '.join(CHECKED)} match the original")
+    args = parser.parse_args()
+
+    if args.dump:
+        with SessionReader(args.session) as reader:
+            for record in reader:
+                print(record)
+        raise SystemExit(0)
+
+    activate_logging_config(logging.WARNING)
+    out = args.out or os.path.join(tempfile.mkdtemp(), "replay.bgrec")
+    real_start = time.perf_counter()
+    result = replay(args.session, out, args.station, args.speed, args.recorded_pressure)
+    real_time = time.perf_counter() - real_start
+
+    print(f"Replayed {result['original']['duration']:.0f} s in {real_time:.1f} s, replay recorded to {out}")
+    print(f"{'':<14}{'original':>12}{'replay':>12}")
+    for key in ("presses", "pulses", "pump_time", "ejects", "reaction_p50", "reaction_max"):
+        print(f"{key:<14}{result['original'][key]:>12.3f}{result['replay'][key]:>12.3f}")
+    if args.check:
+        differences = mismatches(result)
+        for difference in differences:
+            print(f"MISMATCH {difference}")
+        raise SystemExit(1 if differences else 0)
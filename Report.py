@@ -0,0 +1,35 @@
+import argparse
+
+from src.Stats import STATS_FILE, daily_summary, mode_summary, player_summary
+
+
+def print_table(title: str, rows: list[dict]):
+    print(f"\n{title}")
+    if not rows:
+        print("  (no data)")
+        return
+    columns = list(rows[0])
+    cells = [[format_cell(row[column]) for column in columns] for row in rows]
+    widths = [max(len(column), *(len(line[i]) for line in cells)) for i, column in enumerate(columns)]
+    print("  " + "  ".join(column.rjust(width) for column, width in zip(columns, widths)))
+    for line in cells:
+        print("  " + "  ".join(cell.rjust(width) for cell, width in zip(line, widths)))
+
+
+def format_cell(value) -> str:
+    if value is None:
+        return "-"
+    if isinstance(value, float):
+        return f"{value:.2f}"
+    return str(value)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summaries of the stored game statistics.")
+    parser.add_argument("--stats", default=STATS_FILE, help="statistics database written by Ballongame.py")
+    parser.add_argument("--days", type=int, default=30, help="days covered by the daily and player tables")
+    args = parser.parse_args()
+
+    print_table(f"Per day and mode (last {args.days} days)", daily_summary(args.days, args.stats))
+    print_table("Per mode (all time)", mode_summary(args.stats))
+    print_table(f"Per player (last {args.days} days)", player_summary(args.days, args.stats))
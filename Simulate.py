@@ -0,0 +1,151 @@
+import os
+
+os.environ["BALLONGAME_BACKEND"] = "sim"
+
+import argparse
+import logging
+import random
+import tempfile
+import time
+
+from logging_config import activate_logging_config
+from src.Clock import clock, VirtualClock
+
+
+def run_simulation(mode_name: str = "easy", rounds: int = 100, players: int = 4, press_rate: float = 2.0,
+                   calibrate_balloon: bool = False, sensor_sps: int = 10, max_time: float = None,
+                   seed: int = None, iteration_times: list = None, record: str = None,
+                   stats_file: str = None, trace: str = None, watch: bool = False) -> dict:
+    """Plays `rounds` balloons in virtual time and returns the run statistics.
+
+    If iteration_times is given, the real duration of every run_gameloop call is appended to it.
+    If record is given, the session is recorded to that file for Replay.py,
+    if stats_file is given the game statistics are written to that database
+    and if trace is given the per-press latency traces are dumped to that JSON file.
+    With watch, the watchdog checks the game loop and hardware calls in real time
+    and the longest duration of every watched call is returned under "watchdog".
+    """
+    clock.use(VirtualClock())
+    random.seed(seed)
+    if stats_file:
+        from src.Stats import stats
+        stats.open(stats_file)
+    if trace:
+        from src.Tracing import tracer
+        tracer.clear()
+        tracer.enable()
+    from src.Watchdog import watchdog
+    if watch:
+        watchdog.start()
+
+    from src import Simulation
+    from src.Events import START
+    from src.FillModel import calibrate
+    from src.Gamemodes import GamemodeTools, ModeManager
+    from src.Hardware import Pump, ReleaseValve, PressureSensor
+    from src.ModeRules import DEFAULT_MODES, TARGET
+    from src.Recorder import recorder
+
+    machine = Simulation.reset_machine()
+    modes = ("easy", "medium", "hard")  # DEFAULT_MODES
+
+    profile = None
+    if calibrate_balloon:
+        with tempfile.TemporaryDirectory() as tmp:
+            sensor = PressureSensor(channel=1, sps=sensor_sps)
+            pump, valve = Pump(machine.pi), ReleaseValve(machine.pi)
+            profile = calibrate(pump, valve, sensor, "sim", path=os.path.join(tmp, "profiles.json"))
+            sensor.stop_sampling()
+            pump.release()
+            valve.release()  # calibrate leaves the valve open, the game's own valve would not know
+        machine.balloon.replace()
+
+    if record:
+        recorder.start(record)  # after the calibration, the session starts with the game
+    tools = GamemodeTools(machine.pi)
+    tools.wait_ready()
+    if tools.pressure_sensor is not None:
+        Simulation.resample(tools.pressure_sensor, sensor_sps)
+    if profile is not None:
+        tools.set_profile(profile)
+    # Through the ModeManager like the game, so a recording starts with the mode it was played in
+    mode = ModeManager(tools, list(DEFAULT_MODES), modes.index(mode_name)).current
+
+    def player(number: int):
+        client = Simulation.SimMQTTClient()
+        topic = f"Pico{number}/Eingabe"
+        while True:
+            clock.sleep(random.expovariate(press_rate))
+            if mode.rules.trigger == TARGET and mode.random_player != number:
+                continue  # in target modes players only press when their colour is shown
+            client.publish(topic, "1")
+            client.publish(topic, "0")
+
+    for number in range(1, players + 1):
+        clock.start_thread(lambda n=number: player(n), f"Player{number}")
+
+    if max_time is None:
+        max_time = rounds * 600.0
+    real_start = time.perf_counter()
+    cpu_start = time.process_time()
+    tools.events.post(START)
+    while machine.ejects < rounds and clock.monotonic() < max_time:
+        event = tools.events.get()
+        token = watchdog.arm("gameloop", 0.5)
+        if iteration_times is None:
+            mode.run_gameloop(event)
+        else:
+            iteration_start = time.perf_counter()
+            mode.run_gameloop(event)
+            iteration_times.append(time.perf_counter() - iteration_start)
+        watchdog.disarm(token)
+    real_time = time.perf_counter() - real_start
+    if record:
+        recorder.stop()
+    if stats_file:
+        stats.close()
+    if trace:
+        tracer.disable()
+        tracer.dump(trace)
+    if watch:
+        watchdog.stop()
+    cpu_time = time.process_time() - cpu_start
+
+    virtual_time = clock.monotonic()
+    return {
+        "mode": mode_name,
+        "rounds": machine.ejects,
+        "pops": machine.balloon.pops,
+        "virtual_time": virtual_time,
+        "real_time": real_time,
+        "cpu_time": cpu_time,
+        "seconds_per_round": virtual_time / machine.ejects if machine.ejects else float("inf"),
+        "strip_writes": machine.strip_writes,
+        "mqtt_messages": machine.broker.messages,
+        "watchdog": watchdog.summary() if watch else {},
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run game rounds against simulated hardware in virtual time.")
+    parser.add_argument("--mode", choices=["easy", "medium", "hard"], default="easy")
+    parser.add_argument("--rounds", type=int, default=100)
+    parser.add_argument("--players", type=int, default=4)
+    parser.add_argument("--press-rate", type=float, default=2.0, help="button presses per second and player")
+    parser.add_argument("--calibrate", action="store_true", help="calibrate the simulated balloon first")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--record", default=None, help="record the session to this file")
+    parser.add_argument("--stats", default=None, help="write the game statistics to this SQLite file")
+    parser.add_argument("--trace", default=None, help="write per-press latency traces to this Chrome trace JSON")
+    parser.add_argument("--watchdog", action="store_true", help="watch deadlines and print the longest calls")
+    args = parser.parse_args()
+
+    activate_logging_config(logging.WARNING)
+    stats = run_simulation(args.mode, args.rounds, args.players, args.press_rate, args.calibrate, seed=args.seed,
+                           record=args.record, stats_file=args.stats, trace=args.trace,
+                           watch=args.watchdog)
+    print(f"{stats['mode']}: {stats['rounds']} rounds, {stats['pops']} pops in {stats['virtual_time']:.0f} s "
+          f"virtual / {stats['real_time']:.2f} s real ({stats['seconds_per_round']:.1f} s per round, "
+          f"{stats['strip_writes']} strip writes, {stats['mqtt_messages']} MQTT messages)")
+    for name, seconds in sorted(stats["watchdog"].items()):
+        print(f"  longest {name}: {seconds * 1000:.2f} ms")
@@ -1,13 +1,218 @@
+import argparse
+import bisect
+import random
+import threading
 import time
-import paho.mqtt.client as mqtt
-
-mqtt_client = mqtt.Client()
-mqtt_client.username_pw_set(username="PicoNet", password="geheimespasswort")
-mqtt_client.connect("192.168.0.127", 1883, 60)
-
-while True:
-    # mqtt_client.publish("Pico1/Eingabe", "0")
-    # mqtt_client.publish("Pico2/Eingabe", "0")
-    mqtt_client.publish("Pico3/Eingabe", "0")
-    # mqtt_client.publish("Pico4/Eingabe", "0")
-    time.sleep(0.2)
+
+# Load generator for the Pico input path. Every simulated Pico publishes its
+# button state with the send time appended ("0 1712345678.123456"), the game
+# only looks at the first byte. Without --broker the messages go to the
+# in-process broker stand-in with a simulated game attached, so the game
+# reaction latency can be measured as well.
+
+
+class LatencyHistogram:
+    BOUNDS_MS = [0.05, 0.1, 0.2, 0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000]
+
+    def __init__(self, name: str):
+        self.name = name
+        self.counts = [0] * (len(self.BOUNDS_MS) + 1)
+        self.samples: list[float] = []
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float):
+        ms = seconds * 1000
+        with self._lock:
+            self.counts[bisect.bisect_left(self.BOUNDS_MS, ms)] += 1
+            self.samples.append(ms)
+
+    def report(self) -> str:
+        if not self.samples:
+            return f"{self.name}: no samples"
+        ordered = sorted(self.samples)
+
+        def pick(q: float) -> float:
+            return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+        lines = [f"{self.name}: n={len(ordered)}  p50={pick(0.5):.3f} ms  p95={pick(0.95):.3f} ms  "
+                 f"p99={pick(0.99):.3f} ms  max={ordered[-1]:.3f} ms"]
+        peak = max(self.counts)
+        for i, count in enumerate(self.counts):
+            if not count:
+                continue
+            label = f"<= {self.BOUNDS_MS[i]:g} ms" if i < len(self.BOUNDS_MS) else f"> {self.BOUNDS_MS[-1]:g} ms"
+            lines.append(f"  {label:>11} {count:7d} {'#' * max(1, 40 * count // peak)}")
+        return "\n".join(lines)
+
+
+class PicoSimulator:
+    """One Pico: publishes presses at `rate` per second with jitter and optional bursts.
+
+    pattern "press" sends 1, waits `hold`, then 0 (one edge per press).
+    pattern "spam" sends 0 on every tick like the old script did.
+    """
+
+    def __init__(self, client, number: int, topic: str, rate: float, jitter: float, pattern: str,
+                 hold: float, burst: int, burst_every: float, on_send=None):
+        self.client = client
+        self.number = number
+        self.topic = topic
+        self.rate = rate
+        self.jitter = jitter
+        self.pattern = pattern
+        self.hold = hold
+        self.burst = burst
+        self.burst_every = burst_every
+        self.on_send = on_send
+        self.sent = 0
+
+    def publish(self, state: str):
+        sent_at = time.time()
+        self.client.publish(self.topic, f"{state} {sent_at:.6f}")
+        self.sent += 1
+        if state == "0" and self.on_send is not None:
+            self.on_send(self.number, sent_at)
+
+    def press(self):
+        if self.pattern == "spam":
+            self.publish("0")
+            return
+        self.publish("1")
+        time.sleep(self.hold)
+        self.publish("0")
+
+    def run(self, stop: threading.Event):
+        next_burst = time.monotonic() + self.burst_every if self.burst else None
+        while not stop.is_set():
+            period = 1 / self.rate
+            time.sleep(max(0.0, period * (1 + random.uniform(-self.jitter, self.jitter))))
+            self.press()
+            if next_burst is not None and time.monotonic() >= next_burst:
+                for _ in range(self.burst):
+                    self.press()
+                next_burst += self.burst_every
+
+
+def connect_broker(args):
+    """Returns a factory for connected clients, paho is only needed with a real broker."""
+    if args.broker is None:
+        from src.Simulation import SimMQTTClient as Client
+    else:
+        from paho.mqtt.client import Client
+
+    def make_client():
+        client = Client()
+        client.username_pw_set(username=args.username, password=args.password)
+        client.connect(args.broker or "localhost", args.port, 60)
+        client.loop_start()
+        return client
+
+    return make_client
+
+
+def start_local_game(mode_name: str, reaction: LatencyHistogram, last_sent: dict):
+    """Runs a game against the simulated hardware and times every press the game loop picks up."""
+    from src import Simulation
+    from src.Events import START
+    from src.Gamemodes import GamemodeTools, EasyMode, MediumMode, HardMode
+
+    machine = Simulation.reset_machine()
+    tools = GamemodeTools(machine.pi)
+    mode = {"easy": EasyMode, "medium": MediumMode, "hard": HardMode}[mode_name](tools)
+
+    drain = tools.input_pipeline.drain
+
+    def timed_drain():
+        players = drain()
+        now = time.time()
+        for player in players:
+            if player in last_sent:
+                reaction.add(now - last_sent[player])
+        return players
+
+    tools.input_pipeline.drain = timed_drain
+
+    def loop():
+        tools.events.post(START)
+        while True:
+            mode.run_gameloop(tools.events.get())
+
+    threading.Thread(target=loop, daemon=True).start()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulate many Picos publishing button presses.")
+    parser.add_argument("--picos", type=int, default=4)
+    parser.add_argument("--topic", default="Pico{n}/Eingabe", help="topic format, {n} is the Pico number")
+    parser.add_argument("--rate", type=float, default=5.0, help="presses per second and Pico")
+    parser.add_argument("--jitter", type=float, default=0.2, help="relative jitter of the press period")
+    parser.add_argument("--pattern", choices=["press", "spam"], default="press")
+    parser.add_argument("--hold", type=float, default=0.02, help="seconds between 1 and 0 of a press")
+    parser.add_argument("--burst", type=int, default=0, help="extra presses per burst")
+    parser.add_argument("--burst-every", type=float, default=5.0, help="seconds between bursts")
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--broker", default=None, help="MQTT broker host, default is the in-process stand-in")
+    parser.add_argument("--port", type=int, default=1883)
+    parser.add_argument("--username", default="PicoNet")
+    parser.add_argument("--password", default="geheimespasswort")
+    parser.add_argument("--game", choices=["easy", "medium", "hard"], default="easy",
+                        help="mode of the local game, only without --broker")
+    parser.add_argument("--trace", default=None, help="write per-press traces of the local game to this JSON file")
+    args = parser.parse_args()
+
+    if args.broker is None:
+        import os
+        os.environ["BALLONGAME_BACKEND"] = "sim"
+
+    make_client = connect_broker(args)
+    round_trip = LatencyHistogram("broker round trip")
+    reaction = LatencyHistogram("game reaction")
+    last_sent: dict[int, float] = {}
+
+    if args.broker is None:
+        import logging
+        from logging_config import activate_logging_config
+        activate_logging_config(logging.WARNING)
+        if args.trace:
+            from src.Tracing import tracer
+            tracer.enable()
+        start_local_game(args.game, reaction, last_sent)
+
+    def on_echo(client, userdata, msg):
+        parts = msg.payload.split(b" ", 1)
+        if len(parts) == 2:
+            round_trip.add(time.time() - float(parts[1]))
+
+    probe = make_client()
+    probe.on_message = on_echo
+    for n in range(1, args.picos + 1):
+        probe.subscribe(args.topic.format(n=n))
+
+    def on_send(number: int, sent_at: float):
+        last_sent[number] = sent_at
+
+    stop = threading.Event()
+    picos = [PicoSimulator(make_client(), n, args.topic.format(n=n), args.rate, args.jitter, args.pattern,
+                           args.hold, args.burst, args.burst_every, on_send) for n in range(1, args.picos + 1)]
+    threads = [threading.Thread(target=pico.run, args=(stop,), daemon=True) for pico in picos]
+    for thread in threads:
+        thread.start()
+
+    time.sleep(args.duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    sent = sum(pico.sent for pico in picos)
+    print(f"{len(picos)} Picos sent {sent} messages in {args.duration:.0f} s ({sent / args.duration:.0f} msg/s)")
+    print(round_trip.report())
+    if args.broker is None:
+        print(reaction.report())
+        if args.trace:
+            tracer.disable()
+            for name, spans in tracer.stage_latencies().items():
+                histogram = LatencyHistogram(name)
+                for seconds in spans:
+                    histogram.add(seconds)
+                print(histogram.report())
+            tracer.dump(args.trace)
@@ -1,4 +1,9 @@
+import atexit
 import logging
+import logging.handlers
+import queue
+import threading
+import time
 
 # ANSI color codes
 COLORS = {
@@ -10,24 +15,130 @@ COLORS = {
 }
 RESET = "\033[0m"
 
+FORMAT = "%(asctime)s | %(levelname)s | %(name)-15s | %(message)s"
+FILE_FORMAT = "%(asctime)s.%(msecs)03d | %(levelname)-8s | %(threadName)-14s | %(name)-15s | %(message)s"
+
+# Debug messages per second and logger before they are dropped, the loggers below log on every frame or sample
+RATE_LIMITS = {
+    "LED": 10,
+    "DruckSensor": 10,  # PressureSensor logs under its German name
+    "GamemodeTools": 20,
+}
+
+# Arguments of these types can be formatted later in the writer thread without changing their meaning
+_IMMUTABLE = (str, int, float, bool, bytes, tuple, type(None))
+
+
 class ColorFormatter(logging.Formatter):
     def format(self, record):
         levelname = record.levelname
-        if levelname in COLORS:
-            record.levelname = f"{COLORS[levelname]}{levelname:<8}{RESET}"
-        return super().format(record)
+        if levelname not in COLORS:
+            return super().format(record)
+        # Format a copy, other handlers must still see the plain level name
+        colored = logging.makeLogRecord(record.__dict__)
+        colored.levelname = f"{COLORS[levelname]}{levelname:<8}{RESET}"
+        return super().format(colored)
+
+formatter = ColorFormatter(fmt=FORMAT, datefmt="%H:%M:%S")
+
+
+class RateLimitFilter(logging.Filter):
+    """Token bucket per logger for records below WARNING.
+
+    Dropped records are counted and reported with the next record that gets through.
+    """
+
+    def __init__(self, limits: dict, default: float = None):
+        super().__init__()
+        self.limits = limits
+        self.default = default
+        self._buckets: dict[str, list] = {}  # name -> [tokens, last refill, dropped]
+        self._lock = threading.Lock()
+
+    def filter(self, record) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.limits.get(record.name, self.default)
+        if rate is None:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(record.name)
+            if bucket is None:
+                bucket = self._buckets[record.name] = [rate, now, 0]
+            bucket[0] = min(rate, bucket[0] + (now - bucket[1]) * rate)
+            bucket[1] = now
+            if bucket[0] < 1:
+                bucket[2] += 1
+                return False
+            bucket[0] -= 1
+            dropped, bucket[2] = bucket[2], 0
+        if dropped:
+            record.msg = f"{record.msg} (+{dropped} similar messages dropped)"
+        return True
+
 
-formatter = ColorFormatter(
-    fmt="%(asctime)s | %(levelname)s | %(name)-15s | %(message)s",
-    datefmt="%H:%M:%S"
-)
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    """Hands records to the writer thread without formatting them in the logging thread.
+
+    Only when an argument is mutable (e.g. a dict that changes right after the call)
+    the message is rendered here, so the log still shows the state at call time.
+    """
+
+    def prepare(self, record):
+        if record.args and not all(isinstance(arg, _IMMUTABLE) for arg in record.args):
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+
+_listener = None
+
+
+def stop_logging():
+    """Flushes the queue and stops the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def activate_logging_config(level=logging.DEBUG, asynchronous: bool = True, log_file: str = None,
+                            max_bytes: int = 1_000_000, backup_count: int = 3, rate_limits: dict = None):
+    """Logs to the terminal and optionally to a size-rotated file.
+
+    With asynchronous=True the calling threads only put records on a queue and a
+    background thread does the formatting and the terminal and disk I/O.
+    """
+    stop_logging()
 
-def activate_logging_config(level=logging.DEBUG):
     handler = logging.StreamHandler()
     handler.setFormatter(formatter)
+    handlers = [handler]
+    if log_file is not None:
+        file_handler = logging.handlers.RotatingFileHandler(log_file, maxBytes=max_bytes, backupCount=backup_count)
+        file_handler.setFormatter(logging.Formatter(fmt=FILE_FORMAT, datefmt="%Y-%m-%d %H:%M:%S"))
+        handlers.append(file_handler)
 
     logger = logging.getLogger()
     logger.setLevel(level)
     logger.handlers.clear()  # avoid duplicate logs
-    logger.addHandler(handler)
+    if rate_limits is None:
+        rate_limits = RATE_LIMITS
+
+    if asynchronous:
+        global _listener
+        records = queue.SimpleQueue()
+        queue_handler = LazyQueueHandler(records)
+        queue_handler.addFilter(RateLimitFilter(rate_limits))
+        logger.addHandler(queue_handler)
+        _listener = logging.handlers.QueueListener(records, *handlers, respect_handler_level=True)
+        _listener.start()
+    else:
+        for h in handlers:
+            h.addFilter(RateLimitFilter(rate_limits))
+            logger.addHandler(h)
     return logger
+
+
+atexit.register(stop_logging)
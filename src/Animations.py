@@ -0,0 +1,102 @@
+import logging
+import threading
+
+from src.Clock import clock
+
+
+class Animation:
+    """Handle for a running LED animation.
+
+    An animation is a generator that draws one frame per step and yields the
+    delay in seconds until its next frame. The Animator advances it on the
+    render clock, so nothing ever sleeps in the calling thread.
+    """
+
+    def __init__(self, frames, start_led: int, end_led: int, on_done=None):
+        self.frames = frames
+        self.start_led = start_led
+        self.end_led = end_led
+        self.on_done = on_done
+        self.next_time = 0.0
+        self.cancelled = False
+        self._finished = clock.Event()
+
+    @property
+    def done(self) -> bool:
+        return self._finished.is_set()
+
+    def cancel(self):
+        self.cancelled = True
+
+    def join(self, timeout: float = None) -> bool:
+        return self._finished.wait(timeout)
+
+    def overlaps(self, start_led: int, end_led: int) -> bool:
+        return start_led < self.end_led and self.start_led < end_led
+
+    def _finish(self):
+        self.frames.close()
+        self._finished.set()
+
+
+class Animator:
+    def __init__(self, wakeup):
+        self.logger = logging.getLogger("Animator")
+        self._wakeup = wakeup
+        self._lock = threading.Lock()
+        self._animations: list[Animation] = []
+
+    def start(self, frames, start_led: int, end_led: int, on_done=None) -> Animation:
+        animation = Animation(frames, start_led, end_led, on_done)
+        with self._lock:
+            # A new animation takes over its segment from any older one
+            for other in self._animations:
+                if other.overlaps(start_led, end_led):
+                    other.cancel()
+            self._animations.append(animation)
+        self._wakeup.set()
+        return animation
+
+    def cancel_all(self):
+        with self._lock:
+            for animation in self._animations:
+                animation.cancel()
+        self._wakeup.set()
+
+    def is_locked(self, start_led: int, end_led: int) -> bool:
+        with self._lock:
+            return any(a.overlaps(start_led, end_led) and not a.cancelled for a in self._animations)
+
+    def next_deadline(self):
+        with self._lock:
+            if not self._animations:
+                return None
+            return min(a.next_time for a in self._animations)
+
+    def tick(self, now: float):
+        with self._lock:
+            cancelled = [a for a in self._animations if a.cancelled]
+            for animation in cancelled:
+                self._animations.remove(animation)
+            due = [a for a in self._animations if a.next_time <= now]
+
+        # Cancelled animations clean up first, so they never erase the frame of the one replacing them
+        for animation in cancelled:
+            animation._finish()
+
+        finished = []
+        for animation in due:
+            try:
+                animation.next_time = now + next(animation.frames)
+            except StopIteration:
+                finished.append(animation)
+
+        if not finished:
+            return
+        with self._lock:
+            for animation in finished:
+                self._animations.remove(animation)
+        for animation in finished:
+            animation._finish()
+            if animation.on_done is not None and not animation.cancelled:
+                animation.on_done()
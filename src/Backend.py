@@ -0,0 +1,14 @@
+import os
+
+# BALLONGAME_BACKEND=sim swaps every hardware library for the in-process simulation
+BACKEND = os.environ.get("BALLONGAME_BACKEND", "hardware")
+
+if BACKEND == "sim":
+    from src.Simulation import board, neopixel, GPIO, pigpio, Adafruit_ADS1x15, mqtt
+else:
+    import board
+    import neopixel
+    import RPi.GPIO as GPIO
+    import pigpio
+    import Adafruit_ADS1x15
+    import paho.mqtt.client as mqtt
@@ -0,0 +1,201 @@
+import collections
+import queue
+import threading
+import time
+
+
+class RealClock:
+    def time(self) -> float:
+        return time.time()
+
+    def monotonic(self) -> float:
+        return time.monotonic()
+
+    def sleep(self, seconds: float):
+        time.sleep(seconds)
+
+    def Event(self) -> threading.Event:
+        return threading.Event()
+
+    def Queue(self) -> queue.Queue:
+        return queue.Queue()
+
+    def start_thread(self, target, name: str = None) -> threading.Thread:
+        thread = threading.Thread(target=target, name=name, daemon=True)
+        thread.start()
+        return thread
+
+    def join(self, thread: threading.Thread, timeout: float = None):
+        thread.join(timeout)
+
+
+class VirtualClock:
+    """Simulated time shared by all threads of a simulation run.
+
+    Every thread started through start_thread (plus the thread that created the
+    clock) is an actor. Time only moves when all actors are blocked in a clock
+    wait, and then it jumps straight to the earliest deadline, so a run is as
+    fast as the CPU allows while keeping the same ordering as real time.
+    """
+
+    def __init__(self, start: float = 0.0, epoch: float = 1_700_000_000.0):
+        self._now = start
+        self.epoch = epoch
+        self._lock = threading.Lock()
+        self._actors = 1
+        self._waiters: list[_Waiter] = []
+
+    def time(self) -> float:
+        return self.epoch + self._now
+
+    def monotonic(self) -> float:
+        return self._now
+
+    def block(self, predicate, timeout: float = None) -> bool:
+        """Blocks until predicate() is true (True) or the virtual timeout passed (False)."""
+        with self._lock:
+            if predicate():
+                return True
+            deadline = None if timeout is None else self._now + timeout
+            waiter = _Waiter(predicate, deadline, threading.Condition(self._lock))
+            self._waiters.append(waiter)
+            try:
+                while True:
+                    if predicate():
+                        return True
+                    if deadline is not None and self._now >= deadline:
+                        return False
+                    if len(self._waiters) >= self._actors and self._advance():
+                        continue
+                    waiter.condition.wait()
+            finally:
+                self._waiters.remove(waiter)
+
+    def _wake(self) -> bool:
+        # Lock is held. Only runnable waiters are notified, the others keep sleeping.
+        woke = False
+        for waiter in self._waiters:
+            if waiter.runnable(self._now):
+                waiter.condition.notify()
+                woke = True
+        return woke
+
+    def _advance(self) -> bool:
+        # Lock is held and every actor waits, but one of them may already be runnable
+        if self._wake():
+            return False
+        deadlines = [waiter.deadline for waiter in self._waiters if waiter.deadline is not None]
+        if not deadlines:
+            raise RuntimeError("Simulation deadlocked: every thread waits without a timeout")
+        self._now = min(deadlines)
+        self._wake()
+        return True
+
+    def sleep(self, seconds: float):
+        self.block(lambda: False, max(0.0, seconds))
+
+    def Event(self) -> "VirtualEvent":
+        return VirtualEvent(self)
+
+    def Queue(self) -> "VirtualQueue":
+        return VirtualQueue(self)
+
+    def start_thread(self, target, name: str = None) -> threading.Thread:
+        def run():
+            try:
+                target()
+            finally:
+                with self._lock:
+                    thread.finished = True
+                    self._actors -= 1
+                    if self._waiters and len(self._waiters) >= self._actors:
+                        self._advance()
+                    else:
+                        self._wake()
+
+        with self._lock:
+            self._actors += 1
+        thread = threading.Thread(target=run, name=name, daemon=True)
+        thread.finished = False
+        thread.start()
+        return thread
+
+    def join(self, thread: threading.Thread, timeout: float = None):
+        self.block(lambda: thread.finished, timeout)
+
+
+class _Waiter:
+    def __init__(self, predicate, deadline: float, condition: threading.Condition):
+        self.predicate = predicate
+        self.deadline = deadline
+        self.condition = condition
+
+    def runnable(self, now: float) -> bool:
+        return self.predicate() or (self.deadline is not None and self.deadline <= now)
+
+
+class VirtualEvent:
+    def __init__(self, clock: VirtualClock):
+        self._clock = clock
+        self._flag = False
+
+    def is_set(self) -> bool:
+        return self._flag
+
+    def set(self):
+        with self._clock._lock:
+            self._flag = True
+            self._clock._wake()
+
+    def clear(self):
+        self._flag = False
+
+    def wait(self, timeout: float = None) -> bool:
+        return self._clock.block(lambda: self._flag, timeout)
+
+
+class VirtualQueue:
+    def __init__(self, clock: VirtualClock):
+        self._clock = clock
+        self._items = collections.deque()
+
+    def put(self, item):
+        with self._clock._lock:
+            self._items.append(item)
+            self._clock._wake()
+
+    def get(self, block: bool = True, timeout: float = None):
+        if not block:
+            timeout = 0.0
+        item = []
+
+        def ready():
+            # Runs under the clock lock, so taking the item here is atomic
+            if not item and self._items:
+                item.append(self._items.popleft())
+            return bool(item)
+
+        if not self._clock.block(ready, timeout):
+            raise queue.Empty
+        return item[0]
+
+    def get_nowait(self):
+        return self.get(block=False)
+
+    def empty(self) -> bool:
+        return not self._items
+
+
+class _ClockProxy:
+    def __init__(self):
+        self._impl = RealClock()
+
+    def use(self, impl):
+        """Swaps the clock, call it before any hardware or game objects are created."""
+        self._impl = impl
+
+    def __getattr__(self, name):
+        return getattr(self._impl, name)
+
+
+clock = _ClockProxy()
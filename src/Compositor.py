@@ -0,0 +1,100 @@
+# Layers, higher ones cover lower ones where they have a colour
+BASE_LAYER = 0       # plain set_color ranges
+PLAYER_LAYER = 1     # player indicators
+STATUS_LAYER = 2     # game status (idle, pumping, target player)
+ANIMATION_LAYER = 3  # running animations, removed again when they end
+
+LAYERS = 4
+
+RGB = (0, 1, 2)
+
+
+def color_lut(brightness: float = 1.0, gamma: float = 1.0) -> bytes:
+    """256-entry table from a colour channel to the byte sent to the strip."""
+    table = bytearray(256)
+    for value in range(256):
+        level = value if gamma == 1.0 else round(255 * (value / 255) ** gamma)
+        table[value] = int(level * brightness)
+    return bytes(table)
+
+
+OFF = bytes(256)
+
+
+class Segment:
+    __slots__ = ("name", "start", "end", "layer")
+
+    def __init__(self, name: str, start: int, end: int, layer: int = BASE_LAYER):
+        self.name = name
+        self.start = start
+        self.end = end
+        self.layer = layer
+
+    def __repr__(self):
+        return f"Segment({self.name!r}, {self.start}-{self.end}, layer={self.layer})"
+
+
+class Compositor:
+    """Stacks raw RGB layers into one frame in the byte order of the strip.
+
+    Every layer is a bytearray of colours plus a coverage mask, a pixel shows
+    the topmost layer that covers it. render() writes straight into the output
+    buffer through the brightness/gamma table and allocates nothing, so it can
+    run on every frame.
+    """
+
+    def __init__(self, num_leds: int, order: tuple = RGB, lut: bytes = None):
+        self.num_leds = num_leds
+        self.order = order
+        self.lut = color_lut() if lut is None else lut
+        self._data = [bytearray(3 * num_leds) for _ in range(LAYERS)]
+        self._mask = [bytearray(num_leds) for _ in range(LAYERS)]
+        self._top_down = tuple(zip(reversed(self._mask), reversed(self._data)))
+        self._black = bytes(3 * num_leds)
+
+    def fill(self, layer: int, start: int, end: int, color: tuple) -> bool:
+        """Covers start..end of the layer with one colour, False if it already was."""
+        pattern = bytes((int(color[0]), int(color[1]), int(color[2]))) * (end - start)
+        data = self._data[layer]
+        mask = self._mask[layer]
+        if mask.count(1, start, end) == end - start and data[3 * start:3 * end] == pattern:
+            return False
+        data[3 * start:3 * end] = pattern
+        mask[start:end] = b"\x01" * (end - start)
+        return True
+
+    def clear(self, layer: int, start: int, end: int) -> bool:
+        """Uncovers start..end of the layer, the layers below show through again."""
+        mask = self._mask[layer]
+        if not mask.count(1, start, end):
+            return False
+        mask[start:end] = bytes(end - start)
+        return True
+
+    def color_at(self, led: int, below: int = LAYERS) -> tuple:
+        """Raw colour of the topmost layer under `below` that covers the LED."""
+        for layer in range(below - 1, -1, -1):
+            if self._mask[layer][led]:
+                data = self._data[layer]
+                return data[3 * led], data[3 * led + 1], data[3 * led + 2]
+        return 0, 0, 0
+
+    def render(self, out: bytearray, start: int, end: int) -> bool:
+        """Composites start..end into out, True if any byte of it changed."""
+        lut = self.lut
+        r, g, b = self.order
+        changed = False
+        for led in range(start, end):
+            data = self._black
+            for mask, layer_data in self._top_down:
+                if mask[led]:
+                    data = layer_data
+                    break
+            i = 3 * led
+            red, green, blue = lut[data[i]], lut[data[i + 1]], lut[data[i + 2]]
+            if out[i + r] != red or out[i + g] != green or out[i + b] != blue:
+                out[i + r] = red
+                out[i + g] = green
+                out[i + b] = blue
+                changed = True
+        return changed
@@ -0,0 +1,38 @@
+import json
+import logging
+import os
+
+# The JSON config files live in the checkout, next to Ballongame.py
+CONFIG_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def config_path(name: str) -> str:
+    return os.path.join(CONFIG_DIR, name)
+
+
+class JsonConfig:
+    """Config object whose constructor arguments are its attributes, stored as a JSON object."""
+
+    def to_dict(self) -> dict:
+        return {key: list(value) if isinstance(value, tuple) else value for key, value in self.__dict__.items()}
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        return cls(**data)
+
+
+def read_json(path: str, logger: logging.Logger):
+    """The parsed file, None if it does not exist or is not valid JSON (logged, the caller falls back)."""
+    try:
+        with open(path) as file:
+            return json.load(file)
+    except OSError:
+        return None
+    except ValueError as e:
+        logger.warning(f"Ignoring {path} ({e})")
+        return None
+
+
+def write_json(path: str, data):
+    with open(path, "w") as file:
+        json.dump(data, file, indent=4)
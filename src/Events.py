@@ -0,0 +1,125 @@
+import heapq
+import itertools
+import logging
+import queue
+import threading
+
+from src.Clock import clock
+
+# Event kinds
+START = "start"
+INPUT = "input"
+BUTTON = "button"
+TIMER = "timer"
+ACTUATOR = "actuator"
+
+
+class Event:
+    def __init__(self, kind: str, data=None, target=None):
+        self.kind = kind
+        self.data = data
+        self.target = target  # the station the event belongs to, None in a single-station loop
+        self.time = clock.monotonic()
+
+    def __repr__(self):
+        return f"Event({self.kind!r}, {self.data!r})"
+
+
+class Timer:
+    def __init__(self, deadline: float, kind: str, data=None, target=None):
+        self.deadline = deadline
+        self.kind = kind
+        self.data = data
+        self.target = target
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class CancelToken:
+    """Marks everything one mode activation scheduled, so it can be dropped at once on a mode switch."""
+
+    def __init__(self):
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+    def guard(self, callback):
+        """Wraps callback so it does nothing once the token is cancelled."""
+        def guarded(*args):
+            if not self.cancelled:
+                return callback(*args)
+        return guarded
+
+
+class EventLoop:
+    """Event queue plus timer heap for the game loop.
+
+    Any thread may post events or schedule timers. The game loop calls get(),
+    which sleeps until the next event arrives or the earliest timer is due.
+    """
+
+    def __init__(self):
+        self.logger = logging.getLogger("EventLoop")
+        self._queue = clock.Queue()
+        self._timers: list[tuple[float, int, Timer]] = []
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+    def post(self, kind: str, data=None, target=None):
+        self._queue.put(Event(kind, data, target))
+
+    def call_later(self, delay: float, callback, target=None) -> Timer:
+        timer = Timer(clock.monotonic() + delay, TIMER, callback, target)
+        with self._lock:
+            heapq.heappush(self._timers, (timer.deadline, next(self._counter), timer))
+            earliest = self._timers[0][2] is timer
+        if earliest:
+            self._queue.put(None)  # wake get() so it picks up the new deadline
+        return timer
+
+    def _pop_due_timer(self):
+        """Returns (due timer, seconds until the next deadline)."""
+        with self._lock:
+            while self._timers:
+                deadline, _, timer = self._timers[0]
+                if timer.cancelled:
+                    heapq.heappop(self._timers)
+                    continue
+                remaining = deadline - clock.monotonic()
+                if remaining > 0:
+                    return None, remaining
+                heapq.heappop(self._timers)
+                return timer, 0.0
+            return None, None
+
+    def get(self) -> Event:
+        while True:
+            timer, timeout = self._pop_due_timer()
+            if timer is not None:
+                return Event(timer.kind, timer.data, timer.target)
+            try:
+                event = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                continue
+            if event is not None:
+                return event
+
+    def channel(self, target) -> "EventChannel":
+        return EventChannel(self, target)
+
+
+class EventChannel:
+    """One station's view of a shared EventLoop, everything it posts or schedules is tagged with its target."""
+
+    def __init__(self, loop: EventLoop, target):
+        self.loop = loop
+        self.target = target
+
+    def post(self, kind: str, data=None):
+        self.loop.post(kind, data, self.target)
+
+    def call_later(self, delay: float, callback) -> Timer:
+        return self.loop.call_later(delay, callback, self.target)
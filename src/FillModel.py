@@ -0,0 +1,134 @@
+import logging
+
+from src.Clock import clock
+from src.Config import JsonConfig, config_path, read_json, write_json
+
+PROFILE_FILE = config_path("balloon_profiles.json")
+
+
+class BalloonProfile(JsonConfig):
+    def __init__(self, name: str = "default", baseline: float = 0.0, target_pressure: float = None,
+                 pump_rate: float = None, valve_rate: float = None, fill_time: float = 40.0,
+                 valve_factor: float = 1.5):
+        self.name = name
+        self.baseline = baseline                # PSI with an empty balloon
+        self.target_pressure = target_pressure  # PSI when the balloon is full, None = uncalibrated
+        self.pump_rate = pump_rate              # PSI per second of pumping
+        self.valve_rate = valve_rate            # PSI per second with the release valve open
+        self.fill_time = fill_time              # seconds of pumping to fill the balloon
+        self.valve_factor = valve_factor        # valve empties this much slower than the pump fills
+
+
+def load_profile(name: str = "default", path: str = PROFILE_FILE) -> BalloonProfile:
+    logger = logging.getLogger("FillModel")
+    profiles = read_json(path, logger) or {}
+    if name not in profiles:
+        logger.warning(f"No calibration for balloon '{name}', using timing only.")
+        return BalloonProfile(name)
+    return BalloonProfile.from_dict(profiles[name])
+
+
+def save_profile(profile: BalloonProfile, path: str = PROFILE_FILE):
+    profiles = read_json(path, logging.getLogger("FillModel")) or {}
+    profiles[profile.name] = profile.to_dict()
+    write_json(path, profiles)
+
+
+class FillEstimator:
+    """Estimates how full the balloon is, 0.0 = empty, 1.0 = target reached.
+
+    Pump and valve on-times give a prediction that drifts, the pressure sensor
+    gives a noisy measurement. With a calibrated profile both are blended,
+    without one (or without a working sensor) the old timing heuristic is used.
+    """
+
+    def __init__(self, pump, valve, sensor=None, profile: BalloonProfile = None, sensor_weight: float = 0.7):
+        self.logger = logging.getLogger("FillEstimator")
+        self.pump = pump
+        self.valve = valve
+        self.sensor = sensor
+        self.profile = profile or BalloonProfile()
+        self.sensor_weight = sensor_weight
+
+    def balloon_time(self) -> float:
+        return self.pump.open_seconds() - self.valve.open_seconds() / self.profile.valve_factor
+
+    def timing_fill(self) -> float:
+        return self.balloon_time() / self.profile.fill_time
+
+    def pressure_fill(self):
+        if self.sensor is None or not self.sensor.available or self.profile.target_pressure is None:
+            return None
+        span = self.profile.target_pressure - self.profile.baseline
+        return (self.sensor.average_pressure() - self.profile.baseline) / span
+
+    def fill(self) -> float:
+        timing = self.timing_fill()
+        pressure = self.pressure_fill()
+        if pressure is None:
+            return timing
+        return self.sensor_weight * pressure + (1 - self.sensor_weight) * timing
+
+    def target_reached(self, target: float = 1.0) -> bool:
+        return self.fill() >= target
+
+    def pulse_length(self, duration: float, taper: float = 0.2, min_fraction: float = 0.2,
+                     target: float = 1.0) -> float:
+        """Shortens pump pulses once the balloon is within `taper` of the target."""
+        remaining = target - self.fill()
+        if remaining >= taper:
+            return duration
+        return duration * max(min_fraction, remaining / taper)
+
+    def reset(self):
+        self.pump.open_time = 0
+        self.valve.open_time = 0
+
+
+def calibrate(pump, valve, sensor, name: str, fill_time: float = 40.0, pulse: float = 0.5,
+              settle: float = 0.3, empty_time: float = 5.0, path: str = PROFILE_FILE) -> BalloonProfile:
+    """Inflates a fresh balloon once and stores its pressure profile.
+
+    Blocks for roughly fill_time + 2 * empty_time seconds, run it with the game stopped.
+    """
+    logger = logging.getLogger("FillModel")
+    sensor.start_sampling()
+
+    logger.info("Emptying balloon...")
+    valve.open()
+    clock.sleep(empty_time)
+    valve.close()
+    clock.sleep(settle)
+    baseline = sensor.median_pressure()
+
+    logger.info(f"Baseline {baseline:.3f} PSI, inflating for {fill_time} s...")
+    pumped_before = pump.open_seconds()
+    pumped = 0.0
+    while pumped < fill_time:
+        pump.pulse(pulse)
+        clock.sleep(pulse + settle)
+        pumped = pump.open_seconds() - pumped_before  # measured in pigpio ticks, not the requested length
+    target_pressure = sensor.median_pressure()
+
+    valve.open()
+    clock.sleep(empty_time)
+    valve.close()
+    clock.sleep(settle)
+    deflated = sensor.median_pressure()
+    valve.open()
+
+    pump_rate = (target_pressure - baseline) / pumped
+    valve_rate = (target_pressure - deflated) / empty_time
+    profile = BalloonProfile(
+        name=name,
+        baseline=baseline,
+        target_pressure=target_pressure,
+        pump_rate=pump_rate,
+        valve_rate=valve_rate,
+        fill_time=fill_time,
+        valve_factor=pump_rate / valve_rate if valve_rate > 0 else 1.5,
+    )
+    save_profile(profile, path)
+    logger.info(f"Saved profile '{name}': target {target_pressure:.3f} PSI, "
+                f"pump {profile.pump_rate:.4f} PSI/s, valve {profile.valve_rate:.4f} PSI/s")
+    return profile
@@ -1,86 +1,213 @@
 import logging
-from src.Hardware import Pump, ReleaseValve, LED, MiuzeiDigitalServo, Button
-import paho.mqtt.client as mqtt
-import time
+from src.Hardware import Pump, ReleaseValve, LED, MiuzeiDigitalServo, Button, ButtonManager, PressureSensor
+from src.FillModel import BalloonProfile, FillEstimator, load_profile
+from src.ModeRules import ModeRules, load_modes, EASY, MEDIUM, HARD, TARGET
+from src.Events import EventLoop, Event, Timer, CancelToken, START, INPUT, BUTTON, TIMER, ACTUATOR
+from src.Inputs import InputPipeline, InputState, MQTTRouter, input_topics, input_subscription
+from src.Stations import StationConfig
+from src.Backend import board, mqtt, pigpio
+from src.Clock import clock
+from src.Compositor import PLAYER_LAYER, STATUS_LAYER
+from src.Metrics import metrics
+from src.Recorder import recorder, REC_INPUT, REC_MODE, REC_BUTTON, REC_TARGET, BUTTON_CODES
+from src.Stats import stats
+from src.Tracing import tracer
+from src.Watchdog import watchdog
 import random
 
-LED_0 = 0
-LED_1 = 15
-LED_2 = 30
-LED_3 = 44
-LED_4 = 59
-LED_5 = 75
+MQTT_MESSAGES = metrics.counter("ballongame_mqtt_messages_total", "MQTT messages received", ("topic",))
+
+# Strip layout: two player indicators on each side of the game status in the middle
+LED_SEGMENTS = (("player1", 0, 15, PLAYER_LAYER), ("player2", 15, 30, PLAYER_LAYER), ("status", 30, 44, STATUS_LAYER),
+                ("player3", 44, 59, PLAYER_LAYER), ("player4", 59, 75, PLAYER_LAYER))
+PLAYER_COLORS = {1: (255, 80, 150), 2: (255, 255, 0), 3: (0, 255, 255), 4: (255, 70, 0)}  # per indicator
+OTHER_PLAYER_COLOR = (255, 255, 255)  # a fifth player and beyond, no indicator of their own
+
+FILL_CHECK_INTERVAL = 0.1
+
+STATUS_BLINK = 0.5
 
 class GamemodeTools:
-    def __init__(self, pi):
+    """Hardware, inputs and MQTT routing of one balloon station.
+
+    Without further arguments it is the original single station with its own
+    event loop and MQTT client. Ballongame passes a station config, its channel
+    of the shared event loop and the shared MQTT router instead.
+    """
+
+    def __init__(self, pi, balloon: str = None, station: StationConfig = None, events=None,
+                 router: MQTTRouter = None):
         self.logger = logging.getLogger("GamemodeTools")
         self.logger.info("Initializing GamemodeTools")
         
         self.pi = pi
-        self.pump = Pump(self.pi)
-        self.releaseValve = ReleaseValve(self.pi)
-        self.led = LED(self.pi, num_leds=75)
-        self.servo = MiuzeiDigitalServo(self.pi, 13)
+        self.station = station or StationConfig()
+        self.events = EventLoop() if events is None else events
+        self.pump = Pump(self.pi, self.station.pump_io)
+        self.releaseValve = ReleaseValve(self.pi, self.station.valve_io)
+        self.led = LED(self.pi, num_leds=self.station.num_leds, fps=30, pin=getattr(board, self.station.led_pin),
+                       process=self.station.led_process)
+        for name, start_led, end_led, layer in LED_SEGMENTS:
+            self.led.add_segment(name, start_led, end_led, layer)
+        self.servo = MiuzeiDigitalServo(self.pi, self.station.servo_io)
+        self.station_id = recorder.station_id(self.station.name)
+        for device in (self.pump, self.releaseValve, self.led, self.servo):
+            device.station_id = self.station_id
+        # The safe state gets its own daemon connection, the call the watchdog caught may be stuck on self.pi
+        self.safe_pi = pigpio.pi()
+        if not getattr(self.safe_pi, "connected", True):
+            self.logger.warning("No second pigpio connection, the safe state shares the game's")
+            self.safe_pi = self.pi
+        watchdog.add_safe_state(self.safe_state)
+
+        # The pressure sensor comes up in the background, until then the fill level is estimated from timing
+        self.pressure_sensor = None
+        self.fill = FillEstimator(self.pump, self.releaseValve, None, None)
+        self.set_profile(load_profile(balloon or self.station.balloon))
+        self.targets = None  # Replay: deque of recorded target players, shown instead of random ones
+        self.hardware_ready = clock.Event()
+        clock.start_thread(self._init_pressure_sensor, f"SensorInit-{self.station.name}")
         
         self.led.turn_on()
-        self.led.set_color((255, 0, 0), LED_2, LED_3)
+        self.led.set_segment("status", (0, 0, 255))  # starting, the mode draws its idle state once it runs
         
-        self.eject_button = Button(self.pi, 26)
-        self.eject_button.enable_interrupt(callback=self.servo.eject_and_reset, poll_interval=2)
+        self.buttons = ButtonManager(self.pi)
+        self.eject_button = Button(self.pi, self.station.eject_button_io)
+        self.buttons.add(self.eject_button, on_press=self.servo.eject_and_reset)
         
-        self.explode_button = Button(self.pi, 16)
-        self.explode_button.enable_interrupt(callback=self.toggle_explode_mode, poll_interval=2)
+        self.explode_button = Button(self.pi, self.station.explode_button_io)
+        self.buttons.add(self.explode_button, on_press=lambda: self.events.post(BUTTON, "explode"))
         self.explode = False
         
-        self.mqtt_client = mqtt.Client()
+        # The n-th player of the station gets the n-th indicator and its colour, whatever its Pico number
+        self.player_colors = {player: PLAYER_COLORS.get(index, OTHER_PLAYER_COLOR)
+                              for index, player in enumerate(self.station.players, 1)}
+        self.player_segments = {player: f"player{index}" for index, player in enumerate(self.station.players, 1)
+                                if f"player{index}" in self.led.segments}
+        self.inputs = InputState(self.station.players)
+        self.input_pipeline = InputPipeline(self.events, self.inputs,
+                                            input_topics(self.station.topic_prefix, self.station.players))
+        self.previous_payload = self.input_pipeline.previous_payload
+        self._displayed = None
+
+        # Status lamp: off while starting, on when ready, blinking while the broker is unreachable
+        self.ready = False
+        self.mqtt_connected = False
+        self._status_timer = None
+        self.pi.write(self.station.status_io, 0)
+        self.own_router = router is None
+        self.router = MQTTRouter(mqtt.Client()) if router is None else router
+        self.mqtt_client = self.router.client
         self.init_mqtt_client()
-        self.previous_payload = {}
-        self.inputs: dict[int, bool] = {1: False, 2: False, 3: False, 4: False}
         
-        self.pi.write(6, 1)
+        self.register_metrics()
+
+    def set_profile(self, profile: BalloonProfile):
+        self.fill.profile = profile
+        recorder.record_profile(self.station_id, profile)
+
+    def _init_pressure_sensor(self):
+        try:
+            sensor = PressureSensor(channel=self.station.sensor_bus, address=self.station.sensor_address)
+            sensor.station_id = self.station_id
+            sensor.start_sampling()
+        except OSError as e:
+            self.logger.warning(f"Pressure sensor not available ({e}), estimating fill from pump timing.")
+        else:
+            self.pressure_sensor = sensor
+            self.fill.sensor = sensor
+            metrics.callback("ballongame_pressure_latest_psi", "Latest balloon pressure", sensor.latest_pressure,
+                             labels={"station": self.station.name})
+        finally:
+            self.hardware_ready.set()
+
+    def wait_ready(self, timeout: float = None) -> bool:
+        """Blocks until the background hardware init is done, the game itself does not need to wait."""
+        return self.hardware_ready.wait(timeout)
+
+    def register_metrics(self):
+        started = clock.time()
+        labels = {"station": self.station.name}
+        metrics.callback("ballongame_pump_open_seconds_total", "Seconds the pump was running",
+                         self.pump.total_seconds, kind="counter", labels=labels)
+        metrics.callback("ballongame_valve_open_seconds_total", "Seconds the release valve was open",
+                         self.releaseValve.total_seconds, kind="counter", labels=labels)
+        metrics.callback("ballongame_pump_duty_cycle", "Share of the uptime the pump was running",
+                         lambda: self.pump.total_seconds() / max(1e-9, clock.time() - started), labels=labels)
+        metrics.callback("ballongame_valve_duty_cycle", "Share of the uptime the release valve was open",
+                         lambda: self.releaseValve.total_seconds() / max(1e-9, clock.time() - started),
+                         labels=labels)
+        metrics.callback("ballongame_fill_level", "Estimated fill level, 1.0 is a full balloon", self.fill.fill,
+                         labels=labels)
+        metrics.callback("ballongame_mqtt_connected", "1 while the MQTT broker is connected",
+                         lambda: self.router.connected)
         
     def callback(self, client, userdata, msg):
-        payload = msg.payload.decode()
-        topic = msg.topic
-
-        if self.previous_payload.get(topic) == "1" and payload == "0":
-            if topic == "Pico2/Eingabe":
-                self.logger.debug("Input from Player 2 detected.")
-                self.inputs[2] = True
-
-        if payload == "0":
-            if topic == "Pico1/Eingabe":
-                self.logger.debug("Input from Player 1 detected.")
-                self.inputs[1] = True
-            elif topic == "Pico3/Eingabe":
-                self.logger.debug("Input from Player 3 detected.")
-                self.inputs[3] = True
-            elif topic == "Pico4/Eingabe":
-                self.logger.debug("Input from Player 4 detected.")
-                self.inputs[4] = True
-        
-        self.display_inputs()
-        self.previous_payload[topic] = payload
+        if tracer.enabled:
+            tracer.message(msg)
+        MQTT_MESSAGES.labels(msg.topic).inc()
+        if recorder.active:
+            player = self.input_pipeline.topics.get(msg.topic)
+            if player is not None:
+                recorder.record(REC_INPUT, self.station_id, player, msg.payload[0] if msg.payload else 0)
+        player = self.input_pipeline.on_message(msg.topic, msg.payload)
+        if player is not None:
+            self.logger.debug("Input from Player %d detected.", player)
         
     def init_mqtt_client(self):
-        self.mqtt_client.username_pw_set(username="PicoNet", password="geheimespasswort")
-        connected = False
-        while not connected:
-            try:
-                self.mqtt_client.connect("192.168.4.1", 1883, 60)
-                connected = True
-                self.logger.info("Connected to MQTT broker.")
-            except Exception as _:
-                print(f"Connection failed: Retrying in 5 seconds...")
-                time.sleep(5)
-
-        self.mqtt_client.on_message = self.callback
-        self.mqtt_client.subscribe("Pico1/Eingabe")
-        self.mqtt_client.subscribe("Pico2/Eingabe")
-        self.mqtt_client.subscribe("Pico3/Eingabe")
-        self.mqtt_client.subscribe("Pico4/Eingabe")
-        self.mqtt_client.loop_start()
+        """Routes this station's Pico topics; a router of our own also connects in the background."""
+        self.router.add_route(input_subscription(self.station.topic_prefix), self.input_pipeline.topics,
+                              self.callback)
+        self.router.add_listener(self.on_mqtt_status)
+        if self.own_router:
+            self.router.start()
+        elif self.router.connected:
+            self.on_mqtt_status(True)
+
+    def on_mqtt_status(self, connected: bool):
+        self.mqtt_connected = connected
+        self.events.post(TIMER, self.update_status)
+
+    def set_ready(self):
+        self.ready = True
+        self.update_status()
+
+    def update_status(self):
+        """Drives the status lamp, runs on the game loop thread."""
+        if not self.ready:
+            return
+        if self.mqtt_connected:
+            self.pi.write(self.station.status_io, 1)
+        elif self._status_timer is None:
+            self._blink_status()
+
+    def _blink_status(self):
+        status_io = self.station.status_io
+        if self.mqtt_connected:
+            self._status_timer = None
+            self.pi.write(status_io, 1)
+            return
+        self.pi.write(status_io, 0 if self.pi.read(status_io) else 1)
+        self._status_timer = self.events.call_later(STATUS_BLINK, self._blink_status)
         
+    def release(self):
+        """Switches pump and valve off and deletes their pulse scripts, pigpiod keeps at most 32 across restarts."""
+        for actuator in (self.pump, self.releaseValve):
+            try:
+                actuator.release()
+            except Exception:
+                self.logger.exception(f"Could not release {actuator.logger.name}")
+
+    def safe_state(self):
+        """Pump off, valve open, called by the watchdog from its own thread while the game is stuck."""
+        self.pump.force(0, self.safe_pi)
+        self.releaseValve.force(1, self.safe_pi)
+
+    def handle_button(self, name: str):
+        if name == "explode":
+            recorder.record(REC_BUTTON, self.station_id, BUTTON_CODES[name])
+            self.toggle_explode_mode()
+
     def toggle_explode_mode(self):
         if self.explode:
             self.explode = False
@@ -89,273 +216,404 @@ class GamemodeTools:
             self.explode = True
             self.logger.debug("Explode mode activated")
     
-    def display_inputs(self):
-        if self.inputs[1]:
-            self.led.set_color((255, 80, 150), LED_0, LED_1)
-        else:
-            self.led.set_color((0, 0, 0), LED_0, LED_1)
-                
-        if self.inputs[2]:
-            self.led.set_color((255, 255, 0), LED_1, LED_2)
-        else:
-            self.led.set_color((0, 0, 0), LED_1, LED_2)
-                
-        if self.inputs[3]:
-            self.led.set_color((0, 255, 255), LED_3, LED_4)
-        else:
-            self.led.set_color((0, 0, 0), LED_3, LED_4)
-                
-        if self.inputs[4]:
-            self.led.set_color((255, 70, 0), LED_4, LED_5)
-        else:
-            self.led.set_color((0, 0, 0), LED_4, LED_5)
+    def display_inputs(self, force: bool = False):
+        players = self.station.players
+        state = tuple(self.inputs[player] for player in players)
+        if state == self._displayed and not force:
+            return
+        self._displayed = state
+
+        for player, pressed in zip(players, state):
+            segment = self.player_segments.get(player)
+            if segment is None:
+                continue  # no indicator on the strip for this player
+            if pressed:
+                self.led.set_segment(segment, self.player_colors[player])
+            else:
+                self.led.clear_segment(segment)
     
     
 class GenericGamemode:
+    win_at = 1.0
+    idle_color = (255, 0, 0)
+    pump_color = (0, 255, 0)
+
     def __init__(self, logging_name: str, tools: GamemodeTools):
         self.logger = logging.getLogger(logging_name)
         self.mode: str = logging_name
         
         self.tools = tools
+        self.events = tools.events
         
         self.led = tools.led
         self.pump = tools.pump
         self.releaseValve = tools.releaseValve
         self.servo = tools.servo
-        self.servo.reset()
 
         self.inputs = tools.inputs
         self.previous_payload = tools.previous_payload
-        self.reset_input_dict()
         
         self.explode = tools.explode
-        
+        self.reset_state()
+
+    def reset_state(self):
+        """Per-activation state, a mode instance is reused every time the mode is selected again."""
         self.first_cycle = True
         self.won = False
-        self.interrupt_active = False
-        self.waiting = False
+        self.pumping = False
+        self.ejecting = False
+        self._pulse_timer = None
+        self.intro_animation = None
+        self._timers: list[Timer] = []
+        self.token = CancelToken()
+        self.round = None
+        self.prompt_player = 0  # player whose reaction is timed from prompt_time, e.g. the shown target
+        self.prompt_time = None
+
+    def activate(self):
+        self.reset_state()
+        self.reset_input_dict()
+        self.tools.display_inputs(force=True)  # the previous mode's cleanup turned the strip off
 
+    def deactivate(self):
+        """Stops at the current safe point: nothing this activation scheduled runs afterwards."""
+        self.token.cancel()
+        stats.end_round(self.round, "aborted")
+        self.round = None
+        self.cleanup()
 
-    def run_gameloop(self):
+    def run_gameloop(self, event: Event):
+        if self.token.cancelled:
+            return
+        self.update_variables()
+        if self.first_cycle:
+            self.servo.reset()
+            self.round = stats.start_round(self.tools.station.name, self.mode)
+            self.intro()
+            self.on_start()
+
+        if event.kind == TIMER:
+            event.data()
+        elif event.kind == INPUT:
+            players = self.tools.input_pipeline.drain()
+            self.tools.display_inputs()
+            for player in players:
+                self.record_press(player, self.inputs.press_time[player])
+                self.on_input(player)
+            tracer.current = ()
+        elif event.kind == ACTUATOR:
+            self.on_actuator_done(event.data)
+
+    def on_start(self):
+        pass
+
+    def on_input(self, player: int):
+        pass
+
+    def on_pulse_done(self):
+        pass
+
+    def on_actuator_done(self, name: str):
+        if name == "servo" and self.ejecting:
+            self.ejecting = False
+            self.round = stats.start_round(self.tools.station.name, self.mode)
+            self.on_pulse_done()
+
+    def record_press(self, player: int, time: float):
+        if self.round is None:
+            return
+        reaction = None
+        # A press from before the prompt can reach the loop after it (due timers go first), it is no reaction
+        if player == self.prompt_player and self.prompt_time is not None and time >= self.prompt_time:
+            reaction = time - self.prompt_time
+            self.prompt_time = None  # only the first press after the prompt counts
+        stats.press(self.round, player, reaction)
+
+    @property
+    def busy(self) -> bool:
+        return self.pumping or self.ejecting
+
+    def intro(self):
         self.logger.warning("Using generic Gamemode Class. Overwrite this function.")
         raise NotImplementedError()
 
+    def call_later(self, delay: float, callback) -> Timer:
+        self._timers = [t for t in self._timers if not t.cancelled and t.deadline > clock.monotonic()]
+        timer = self.events.call_later(delay, self.token.guard(callback))
+        self._timers.append(timer)
+        return timer
+
     def print_mode(self):
         self.logger.info(f"Mode is set to: {str(self.mode)}")
 
     def reset_input_dict(self):
-        self.tools.inputs = {1: False, 2: False, 3: False, 4: False}     
+        # Only moves the read cursor, presses racing with it stay visible
+        self.inputs.clear()
 
     def cleanup(self):
         self.logger.info("Cleaning up Gamemode resources...")
+        for timer in self._timers:
+            timer.cancel()
+        self._timers.clear()
+        self.pumping = False
+        self.ejecting = False
+        self.led.cancel_animations()
         self.pump.close()
         self.releaseValve.close()
         self.led.turn_off()
         self.servo.reset()
         
+    def show_idle(self):
+        self.led.set_segment("status", self.idle_color)
+
+    def deflate(self):
+        self.show_idle()
+        self.releaseValve.open()
+
+    def pulse_pump(self, duration: float):
+        if self.won:
+            self.tools.fill.reset()
+            self.won = False
+        if not self.explode:
+            duration = self.tools.fill.pulse_length(duration, target=self.win_at)
+        self.releaseValve.close()
+        self.led.set_segment("status", self.pump_color)
+        self.pump.pulse(duration)  # timed by pigpiod, the timer below only runs the game logic
+        self.pumping = True
+        if self.round is not None:
+            self.round.pulses += 1
+        self._pulse_timer = self.call_later(duration, self._end_pulse)
+        self.call_later(FILL_CHECK_INTERVAL, self._watch_fill)
+
+    def _watch_fill(self):
+        if not self.pumping:
+            return
+        if self.tools.fill.target_reached(self.win_at) and not self.explode:
+            self._pulse_timer.cancel()
+            self._end_pulse()
+        else:
+            self.call_later(FILL_CHECK_INTERVAL, self._watch_fill)
+
+    def _end_pulse(self):
+        self.pump.close()
+        self.pumping = False
+        self.check_balloon()
+        if not self.ejecting:  # otherwise the pulse cycle ends when the servo is back
+            self.on_pulse_done()
+
+    def check_balloon(self):
+        fill = self.tools.fill.fill()
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug("fill: %.2f (on-time: %.1f)", fill, self.tools.fill.balloon_time())
+        if fill < 0:
+            self.tools.fill.reset()
+        if fill >= self.win_at and not self.explode:
+            self.ejecting = True
+            done = self.token.guard(lambda: self.events.post(ACTUATOR, "servo"))
+            self.servo.eject_and_reset().add_done_callback(lambda _: done())
+            stats.end_round(self.round, "won")
+            self.round = None
+            self.won = True
+            self.tools.fill.reset()
+
+    def count_inputs(self, tick: int = None) -> int:
+        input_amount = self.inputs.count(tick)
+        self.logger.debug("%s -> %d inputs detected.", self.inputs, input_amount)
+        return input_amount
+
     def update_variables(self):
-        self.inputs = self.tools.inputs
         self.previous_payload = self.tools.previous_payload
         self.explode = self.tools.explode
 
 
-class EasyMode(GenericGamemode):
-    def __init__(self, tools: GamemodeTools):
-        super().__init__("Easy Mode", tools)
+class RuleMode(GenericGamemode):
+    """Gamemode built from a ModeRules description.
 
-    def run_gameloop(self):
-        self.reset_input_dict()
-        self.update_variables()
-        self.tools.display_inputs()
-        
-        time.sleep(0.1)
-        if self.first_cycle:
-            self.interrupt_active = True
-            self.intro()
-            self.interrupt_active = False
+    The trigger picks the input, start and pulse handlers once at construction,
+    so every mode runs the same sleep-free pulse/eject cycle of GenericGamemode.
+    """
 
-        if self.interrupt_active:
-            self.waiting = True
-            return
-        self.waiting = False
-
-        input_detected = False
-        for key in self.inputs:
-            if self.inputs[key]:
-                self.logger.debug(f"Input from Player {key} in GameLoop detected.")
-                input_detected = True
-                
-        if input_detected:
-            if self.won:
-                self.pump.open_time = 0
-                self.releaseValve.open_time = 0
-                self.won = False
-            self.releaseValve.close()
-            self.led.set_color((0, 255, 0), LED_2, LED_3)
-            self.pump.open()
-            time.sleep(1.5)
-            self.pump.close()
-
-            balloon_time = self.pump.open_time - self.releaseValve.open_time / 1.5
-            self.logger.debug(f"on-time: {balloon_time}")
-            if balloon_time < 0:
-                self.pump.open_time = 0
-                self.releaseValve.open_time = 0
-            if balloon_time > 40 and not self.explode:
-                self.servo.eject_and_reset()
-                self.won = True
-                self.pump.open_time = 0
-                self.releaseValve.open_time = 0
-        else:
-            self.led.set_color((255, 0, 0), LED_2, LED_3)
-            self.releaseValve.open()
+    def __init__(self, tools: GamemodeTools, rules: ModeRules):
+        self.rules = rules
+        super().__init__(rules.name, tools)
+        self.win_at = rules.win_at
+        self.idle_color = rules.idle_color
+        self.pump_color = rules.pump_color
+        self.last_player = 0
+
+        self.on_start = getattr(self, f"_{rules.trigger}_start")
+        self.on_input = getattr(self, f"_{rules.trigger}_input")
+        self.on_pulse_done = getattr(self, f"_{rules.trigger}_pulse_done")
+
+    def reset_state(self):
+        super().reset_state()
+        self.idle_timer = None
+        self.random_player = 0
 
     def intro(self):
-        self.logger.debug("Starting Intro Sequence for EasyMode")
-        self.led.set_color((0, 255, 0), LED_2, LED_3)
-        self.led.load_bar(start_led=LED_2, end_led=LED_3)
-        self.led.set_color((255, 0, 0), LED_2, LED_3)
+        self.logger.debug("Starting Intro Sequence for %s", self.mode)
+        self.led.set_segment("status", self.rules.intro_color)
+        # on_done runs on the LED thread, the game state is only touched by the loop
+        on_done = self.token.guard(lambda: self.events.post(TIMER, self.token.guard(self._intro_done)))
+        self.intro_animation = self.led.load_bar(segment="status", on_done=on_done)
         self.first_cycle = False
 
+    def _intro_done(self):
+        if self.busy:
+            return  # a pulse or eject started during the intro and owns the status segment
+        if self.rules.trigger == TARGET:
+            self.show_target()
+        else:
+            self.show_idle()
+
+    def settle(self):
+        """After a pulse or a failed evaluation: deflate now, later or never, depending on the rules."""
+        if self.rules.deflate_delay is None:
+            self.show_idle()
+        elif self.rules.deflate_delay > 0:
+            self.idle_timer = self.call_later(self.rules.deflate_delay, self.deflate)
+        else:
+            self.deflate()
 
-class MediumMode(GenericGamemode):
-    def __init__(self, tools: GamemodeTools):
-        super().__init__("Medium Mode", tools)
+    # PRESS: every press pumps
+    def _press_start(self):
+        self.deflate()
 
-    def run_gameloop(self):
-        self.update_variables()
+    def _press_input(self, player: int):
+        if self.busy:
+            return
+        self.logger.debug("Input from Player %d in GameLoop detected.", player)
+        if self.idle_timer is not None:
+            self.idle_timer.cancel()
+        self.pulse_pump(self.rules.pulse)
+
+    def _press_pulse_done(self):
+        # Inputs that arrived while pumping don't count, players have deflate_delay to press again
+        self.reset_input_dict()
         self.tools.display_inputs()
-        
-        if self.first_cycle:
-            self.interrupt_active = True
-            self.intro()
-            self.interrupt_active = False
-            self.reset_input_dict()
+        self.settle()
 
-        if self.interrupt_active:
-            self.waiting = True
-            return
-        self.waiting = False
-
-        input_amount = 0
-        for key in self.tools.inputs:
-            if self.tools.inputs[key]:
-                input_amount += 1
-        self.logger.debug(f"{self.tools.inputs} -> {input_amount} inputs detected.")
-        if input_amount > 1:
-            self.releaseValve.close()
-            if self.won:
-                self.pump.open_time = 0
-                self.releaseValve.open_time = 0
-                self.won = False
-            self.reset_input_dict()
-            self.led.set_color((0, 255, 0) , LED_2, LED_3)
-            self.pump.open()
-            time.sleep(2)
-            self.pump.close()
-
-            balloon_time = self.pump.open_time - self.releaseValve.open_time / 1.5
-            self.logger.debug(f"on-time: {balloon_time}")
-            if balloon_time < 0:
-                self.pump.open_time = 0
-                self.releaseValve.open_time = 0
-            if balloon_time > 40 and not self.explode:
-                self.servo.eject_and_reset()
-                self.won = True
-                self.pump.open_time = 0
-                self.releaseValve.open_time = 0
+    # PLAYERS: enough different players have to press
+    def _players_start(self):
+        self.reset_input_dict()
+        self.deflate()
+
+    def _players_input(self, player: int):
+        if not self.busy:
+            self.evaluate_inputs()
+
+    def _players_pulse_done(self):
+        self.evaluate_inputs()
+
+    def evaluate_inputs(self):
+        tick = self.inputs.tick()  # a press after this one stays for the next evaluation
+        if self.count_inputs(tick) >= self.rules.min_players:
+            self.inputs.clear(tick)
+            self.tools.display_inputs()
+            self.pulse_pump(self.rules.pulse)
         else:
-            self.releaseValve.open()
-            self.led.set_color((255, 0, 0), LED_2, LED_3)
-            time.sleep(1)
+            self.settle()
 
-    def intro(self):
-        self.led.set_color((0, 0, 255), LED_2, LED_3)
-        self.led.load_bar(start_led=LED_2, end_led=LED_3)
-        self.led.set_color((255, 0, 0), LED_2, LED_3)
-        self.first_cycle = False
+    # TARGET: only the shown player may press
+    def _target_start(self):
+        self.start_round()
 
+    def _target_input(self, player: int):
+        pass  # evaluated when the window closes
 
-class HardMode(GenericGamemode):
-    def __init__(self, tools: GamemodeTools):
-        super().__init__("Hard Mode", tools)
-        self.last_player = 0
+    def _target_pulse_done(self):
+        self.reset_input_dict()
+        self.start_round()
 
-    def run_gameloop(self):
+    def start_round(self):
         self.reset_input_dict()
-        self.update_variables()
         self.tools.display_inputs()
-        
-        if self.first_cycle:
-            self.interrupt_active = True
-            self.intro()
-            self.releaseValve.open()
-            self.interrupt_active = False
-
-        if self.interrupt_active:
-            self.waiting = True
-            return
-        self.waiting = False
-
-        self.releaseValve.close()
+        if self.rules.deflate_delay is None:
+            self.releaseValve.close()
 
-        random_player = self.choose_random_player()
-        self.led.set_color(self.get_color_by_player(random_player), LED_2, LED_3)
-        time.sleep(1.5)
-        
-        input_amount = 0
-        for key in self.tools.inputs:
-            if self.tools.inputs[key]:
-                input_amount += 1
-        self.logger.debug(f"{self.tools.inputs} -> {input_amount} inputs detected.")
-        
-        if self.inputs[random_player] and input_amount == 1:
-            if self.won:
-                self.pump.open_time = 0
-                self.releaseValve.open_time = 0
-                self.won = False
-            self.led.set_color((0, 255, 0), LED_2, LED_3)
-            self.pump.open()
-            time.sleep(5)
-            self.pump.close()
-            self.reset_input_dict()
-
-            balloon_time = self.pump.open_time - self.releaseValve.open_time / 1.5
-            self.logger.debug(f"on-time: {balloon_time}")
-            if balloon_time < 0:
-                self.pump.open_time = 0
-                self.releaseValve.open_time = 0
-            if balloon_time > 40 and not self.explode:
-                self.servo.eject_and_reset()
-                self.won = True
-                self.pump.open_time = 0
-                self.releaseValve.open_time = 0
+        if self.tools.targets:
+            self.random_player = self.last_player = self.tools.targets.popleft()
         else:
-            self.led.set_color((255, 0, 0), LED_2, LED_3)
-            time.sleep(0.5)
-
-    def intro(self):
-        self.led.set_color((255, 0, 0), LED_2, LED_3)
-        self.led.load_bar(start_led=LED_2, end_led=LED_3)
-        self.first_cycle = False
+            self.random_player = self.choose_random_player()
+        recorder.record(REC_TARGET, self.tools.station_id, self.random_player)
+        self.show_target()
+        self.call_later(self.rules.window, self.evaluate_round)
+
+    def show_target(self):
+        if self.random_player:
+            self.led.set_segment("status", self.get_color_by_player(self.random_player))
+            self.prompt_player = self.random_player
+            self.prompt_time = clock.monotonic()
+
+    def evaluate_round(self):
+        input_amount = self.count_inputs()
+        if self.inputs[self.random_player] and input_amount == 1:
+            self.pulse_pump(self.rules.pulse)
+        else:
+            self.led.set_segment("status", self.idle_color)
+            if self.rules.deflate_delay is not None:
+                self.releaseValve.open()
+            self.call_later(self.rules.retry_delay, self.start_round)
 
     def choose_random_player(self) -> int:
-        players = [1, 2, 3, 4]
-        if self.last_player in players:
+        players = list(self.tools.station.players)
+        if self.last_player in players and len(players) > 1:
             players.remove(self.last_player)
         random_player = random.choice(players)
         self.last_player = random_player
         return random_player
 
     def get_color_by_player(self, player: int) -> tuple[int, int, int]:
-        if player == 1:
-            return 255, 80, 150
-        elif player == 2:
-            return 255, 255, 0
-        elif player == 3:
-            return 0, 255, 255
-        elif player == 4:
-            return 255, 80, 0
-        else:
-            self.logger.warning(f"Player {player} is not matched with a color.")
-            raise NotImplementedError
+        return self.tools.player_colors.get(player, OTHER_PLAYER_COLOR)
+
+
+class EasyMode(RuleMode):
+    def __init__(self, tools: GamemodeTools, rules: ModeRules = EASY):
+        super().__init__(tools, rules)
+
+
+class MediumMode(RuleMode):
+    def __init__(self, tools: GamemodeTools, rules: ModeRules = MEDIUM):
+        super().__init__(tools, rules)
+
+
+class HardMode(RuleMode):
+    def __init__(self, tools: GamemodeTools, rules: ModeRules = HARD):
+        super().__init__(tools, rules)
+
+
+class ModeManager:
+    """Keeps one instance per mode and switches between them on the game loop thread.
+
+    The old mode is deactivated first (timers dropped, pump and valve closed,
+    servo back to normal), then the next one is activated and gets a START event.
+    """
+
+    def __init__(self, tools: GamemodeTools, rules: list[ModeRules] = None, index: int = 0):
+        self.logger = logging.getLogger("ModeManager")
+        self.tools = tools
+        if rules is None:
+            rules = load_modes()
+        self.modes: list[GenericGamemode] = [RuleMode(tools, mode_rules) for mode_rules in rules]
+        self.index = index % len(self.modes)
+        self.current.activate()
+        recorder.record(REC_MODE, tools.station_id, self.index)
+
+    @property
+    def current(self) -> GenericGamemode:
+        return self.modes[self.index]
+
+    def switch_to(self, index: int):
+        start = clock.monotonic()
+        self.current.deactivate()
+        self.index = index % len(self.modes)
+        self.current.activate()
+        recorder.record(REC_MODE, self.tools.station_id, self.index)
+        self.tools.events.post(START)
+        self.logger.info("Changing Mode to %s! (%.1f ms)", self.current.mode, (clock.monotonic() - start) * 1000)
+
+    def next(self):
+        self.switch_to(self.index + 1)
+
+    def run_gameloop(self, event: Event):
+        self.current.run_gameloop(event)
@@ -1,131 +1,504 @@
 import logging
-import board
-import neopixel
-import RPi.GPIO as GPIO
-import pigpio
 import threading
-import time
+import queue
 import math
-import random
-import Adafruit_ADS1x15
+import array
+from concurrent.futures import Future
 
+from src.Backend import board, neopixel, pigpio, Adafruit_ADS1x15
+from src.Animations import Animation, Animator
+from src.Clock import clock
+from src.Compositor import Compositor, Segment, color_lut, OFF, RGB, BASE_LAYER, ANIMATION_LAYER
+from src.Metrics import metrics
+from src.Recorder import recorder, pack_color, REC_PUMP, REC_VALVE, REC_SERVO, REC_LED, REC_PRESSURE
+from src.Tracing import tracer, ACTUATOR, LED as LED_STAGE
+from src.Watchdog import watchdog
 
-class Pump:
-    def __init__(self, pi):
-        self.logger = logging.getLogger("Pump")
-        self.io = 17
-        self.pi = pi
-        self.open_time = 0
-        self.start_time = 0
-        self.state = False
+LED_STRIP_WRITES = metrics.counter("ballongame_led_strip_writes_total", "Frames transmitted to the LED strip")
+SERVO_EJECTS = metrics.counter("ballongame_servo_ejects_total", "Eject motions of the servo")
+PRESSURE = metrics.histogram("ballongame_pressure_psi", "Sampled balloon pressure",
+                             buckets=(0.05, 0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.8, 1.0, 1.2, 1.4))
 
-    def open(self):
-        if self.state is False:
-            self.state = True
-            self.pi.write(self.io, 1)
-            self.start_time = time.time()
 
-    def close(self):
-        if self.state is True:
-            self.state = False
-            self.pi.write(self.io, 0)
-            self.open_time += time.time() - self.start_time
+# Pulse program for the pigpio daemon: p0 high for p1 ms + p2 µs. The ticks right after both edges land
+# in p3 and p4, p5 becomes 1 once p3 is valid.
+PULSE_SCRIPT = b"w p0 1 tick sta p3 lda 1 sta p5 mils p1 mics p2 w p0 0 tick sta p4"
+SCRIPT_INITING = 0  # PI_SCRIPT_INITING
+SCRIPT_RUNNING = 2  # PI_SCRIPT_RUNNING
 
+# Watchdog deadline for one pigpio, I2C or strip call, they normally take well under a millisecond
+HARDWARE_DEADLINE = 0.25
 
-class ReleaseValve:
-    def __init__(self, pi):
-        self.logger = logging.getLogger("ReleaseValve")
-        self.io = 27
+
+class Actuator:
+    """Switched GPIO output (pump, valve) with on-time counted in pigpio ticks.
+
+    pulse() hands the whole pulse to a script inside pigpiod, so its length does
+    not depend on what the Python threads are doing, and returns at once. The
+    on-time of a finished pulse comes from the daemon's microsecond ticks taken
+    right after both edges. open()/close() still switch by hand, timed by the
+    tick counter as well.
+    """
+
+    kind = 0
+
+    def __init__(self, pi, io: int, name: str):
+        self.logger = logging.getLogger(name)
+        self.io = io
         self.pi = pi
-        self.open_time = 0
-        self.start_time = 0
+        self.station_id = 0
+        self.open_time = 0.0  # seconds of finished openings, the fill model resets it per balloon
+        self.total_open_time = 0.0  # same, but never reset
+        self.start_tick = 0
         self.state = False
+        self._pulse_length = 0.0
+        self._pulse_started = 0.0
+        self._pulse_end = None  # clock.monotonic() when the running pulse ends
+        self._pulses = 0
+        self._lock = threading.Lock()
+        self._script = self._store_script()
+
+    def _store_script(self):
+        try:
+            script = self.pi.store_script(PULSE_SCRIPT)
+        except Exception as e:  # pigpio.error, old daemons without scripts
+            self.logger.warning("No pigpio pulse script on GPIO %d (%s), pulses are timed in Python", self.io, e)
+            return None
+        deadline = clock.monotonic() + 1.0
+        while self.pi.script_status(script)[0] == SCRIPT_INITING and clock.monotonic() < deadline:
+            clock.sleep(0.001)
+        return script
+
+    def _tick_seconds(self, start_tick: int, end_tick: int) -> float:
+        return pigpio.tickDiff(start_tick & 0xFFFFFFFF, end_tick & 0xFFFFFFFF) / 1_000_000
 
     def open(self):
-        if self.state is False:
-            self.state = True
-            self.pi.write(self.io, 1)
-            self.start_time = time.time()
+        with watchdog.watch(self.logger.name, HARDWARE_DEADLINE), self._lock:
+            self._stop_pulse()
+            if self.state is False:
+                self.state = True
+                self.pi.write(self.io, 1)
+                self.start_tick = self.pi.get_current_tick()
+                recorder.record(self.kind, self.station_id, self.io, value=1.0)
+                if tracer.current:
+                    tracer.mark_current(ACTUATOR)
 
     def close(self):
+        with watchdog.watch(self.logger.name, HARDWARE_DEADLINE), self._lock:
+            self._stop_pulse()
+            self._switch_off()
+
+    def force(self, level: int, pi=None):
+        """Sets the pin without taking the lock, for the watchdog's safe state while a call may be stuck holding it.
+
+        pi is a second daemon connection, the stuck call may be blocking self.pi.
+        The on-time of the opening in progress is booked, and the state follows
+        the pin, so the game switches it normally again once it recovers.
+        """
+        pi = pi or self.pi
+        if self._script is not None:
+            try:
+                pi.stop_script(self._script)
+            except Exception as e:
+                self.logger.warning("Could not stop the pulse script on GPIO %d: %s", self.io, e)
+        pi.write(self.io, level)
+        tick = pi.get_current_tick()
+        if self.state:
+            if self._pulse_end is not None and self._script is not None:
+                on_time = min(self._pulse_length, clock.monotonic() - self._pulse_started)
+            else:
+                on_time = self._tick_seconds(self.start_tick, tick)
+            self.open_time += on_time
+            self.total_open_time += on_time
+        self._pulse_end = None
+        self.start_tick = tick
+        self.state = bool(level)
+        recorder.record(self.kind, self.station_id, self.io, value=float(level))
+
+    def _switch_off(self):
+        # Lock is held. Ends an opening by hand.
         if self.state is True:
+            self.pi.write(self.io, 0)
+            on_time = self._tick_seconds(self.start_tick, self.pi.get_current_tick())
+            self.open_time += on_time
+            self.total_open_time += on_time
             self.state = False
+            recorder.record(self.kind, self.station_id, self.io, value=0.0)
+
+    def pulse(self, duration: float):
+        """Switches on for duration seconds, timed by pigpiod. close() ends the pulse early."""
+        micros = max(0, int(round(duration * 1_000_000)))
+        with watchdog.watch(self.logger.name, HARDWARE_DEADLINE), self._lock:
+            self._stop_pulse()
+            self._switch_off()
+            if self._script is None:
+                self.pi.write(self.io, 1)
+                self.start_tick = self.pi.get_current_tick()
+            else:
+                self.pi.run_script(self._script, [self.io, micros // 1000, micros % 1000, 0, 0, 0])
+            self.state = True
+            self._pulses += 1
+            pulse = self._pulses
+            self._pulse_length = duration
+            self._pulse_started = clock.monotonic()
+            self._pulse_end = self._pulse_started + duration
+            recorder.record(self.kind, self.station_id, self.io, value=1.0)
+            if tracer.current:
+                tracer.mark_current(ACTUATOR)
+        if self._script is None:
+            clock.start_thread(lambda: self._end_pulse_later(pulse, duration), f"{self.logger.name}Pulse")
+
+    def _end_pulse_later(self, pulse: int, duration: float):
+        # Fallback without the daemon script
+        clock.sleep(duration)
+        with self._lock:
+            if self._pulses == pulse:
+                self._stop_pulse()
+
+    def _sync(self):
+        # Lock is held. Picks up a pulse the daemon has finished on its own.
+        if self._pulse_end is None or clock.monotonic() < self._pulse_end:
+            return
+        if self._script is not None:
+            status, _ = self.pi.script_status(self._script)
+            if status == SCRIPT_RUNNING:
+                return
+        self._stop_pulse()
+
+    def _stop_pulse(self):
+        # Lock is held. Ends the running pulse (if the daemon has not already) and books its on-time.
+        if self._pulse_end is None:
+            return
+        if self._script is None:
             self.pi.write(self.io, 0)
-            self.open_time += time.time() - self.start_time
+            on_time = self._tick_seconds(self.start_tick, self.pi.get_current_tick())
+        else:
+            status, params = self.pi.script_status(self._script)
+            if status == SCRIPT_RUNNING:
+                self.pi.stop_script(self._script)
+                self.pi.write(self.io, 0)
+                end_tick = self.pi.get_current_tick()
+                status, params = self.pi.script_status(self._script)
+            else:
+                end_tick = params[4]
+            on_time = self._tick_seconds(params[3], end_tick) if params[5] else 0.0  # stopped before it switched on
+        self.open_time += on_time
+        self.total_open_time += on_time
+        self.state = False
+        self._pulse_end = None
+        recorder.record(self.kind, self.station_id, self.io, value=0.0)
+
+    def open_seconds(self) -> float:
+        """open_time including the current opening."""
+        with self._lock:
+            self._sync()
+            return self.open_time + self._running_seconds()
+
+    def total_seconds(self) -> float:
+        """total_open_time including the current opening, only ever grows."""
+        with self._lock:
+            self._sync()
+            return self.total_open_time + self._running_seconds()
+
+    def _running_seconds(self) -> float:
+        # Lock is held. On-time of the current opening so far.
+        if not self.state:
+            return 0.0
+        if self._pulse_end is not None and self._script is not None:
+            return min(self._pulse_length, clock.monotonic() - self._pulse_started)
+        return self._tick_seconds(self.start_tick, self.pi.get_current_tick())
+
+    def pulse_running(self) -> bool:
+        with self._lock:
+            self._sync()
+            return self._pulse_end is not None
+
+    def release(self):
+        """Switches off and frees the daemon script."""
+        self.close()
+        if self._script is not None:
+            self.pi.delete_script(self._script)
+            self._script = None
+
+
+class Pump(Actuator):
+    kind = REC_PUMP
+
+    def __init__(self, pi, io: int = 17):
+        super().__init__(pi, io, "Pump")
+
+
+class ReleaseValve(Actuator):
+    kind = REC_VALVE
+
+    def __init__(self, pi, io: int = 27):
+        super().__init__(pi, io, "ReleaseValve")
+
+
+def strip_buffer(pixels) -> tuple:
+    """The byte buffer the strip driver transmits and its (r, g, b) byte offsets.
+
+    adafruit NeoPixel keeps the transmitted bytes in _post_brightness_buffer as
+    long as its own brightness is 1.0, so frames can be composited straight
+    into it. Returns (None, RGB) for drivers without such a buffer.
+    """
+    buffer = getattr(pixels, "_post_brightness_buffer", None)
+    order = getattr(pixels, "_byteorder", None)
+    if (isinstance(buffer, bytearray) and getattr(pixels, "_pre_brightness_buffer", None) is None
+            and getattr(pixels, "_offset", 0) == 0 and getattr(pixels, "bpp", 3) == 3
+            and order is not None and len(order) == 3):
+        return buffer, tuple(order)
+    return None, RGB
 
 
 class LED:
-    def __init__(self, pi, num_leds :int = 1):
+    """WS2812 strip composed from layered, named segments.
+
+    Player indicators, the game status and animations draw on their own layers
+    (see src/Compositor.py), so they never overwrite each other. Colours are
+    stored raw; brightness and gamma are applied through a lookup table while
+    the render thread composites the dirty ranges into the driver's buffer.
+    With process=True the strip is driven by a StripProcess instead and every
+    frame is handed over through shared memory.
+    """
+
+    def __init__(self, pi, num_leds :int = 1, fps: float = 30, buffered: bool = True, pin=None,
+                 brightness: float = 0.3, gamma: float = 1.0, process: bool = False):
         self.logger = logging.getLogger("LED")
-        self.pin = board.D18
+        self.pin = board.D18 if pin is None else pin
         self.pi = pi
+        self.station_id = 0
         self.num_leds = num_leds
-        self.pixels = neopixel.NeoPixel(self.pin, num_leds, auto_write=True)
-        self._color = (0, 0, 0)
+        self.strip = None
+        self.pixels = None
+        if process:
+            from src.StripProcess import StripProcess
+            self.strip = StripProcess(self.pin, num_leds, name=f"LEDStrip-{self.pin}")
+        else:
+            self.pixels = neopixel.NeoPixel(self.pin, num_leds, auto_write=False)
         self._state = False
-        self._brightness = 0.3  # default full brightness
-        self.animation_lock = False
-
-    def _apply_color(self, start_led: int = 0, end_led: int = None):
-        if start_led != 30 and self._color != (0, 0, 0):
-            self.logger.debug(f"Applying color {self._color} in range {start_led}-{end_led}")
-        if self._state:
-            scaled = tuple(int(c * self._brightness) for c in self._color)
-            self.pixels[start_led:end_led] = [scaled] * self.num_leds
+        self._brightness = max(0.0, min(1.0, brightness))
+        self.gamma = gamma
+        self._lut = color_lut(self._brightness, gamma)
+
+        self.segments: dict[str, Segment] = {}
+        if self.strip is not None:
+            self._out, order = bytearray(3 * num_leds), self.strip.order
+            self._direct = True
         else:
-            self.pixels[start_led:end_led] = [(0, 0, 0)] * self.num_leds
+            self._out, order = strip_buffer(self.pixels)
+            self._direct = self._out is not None
+        if self._out is None:
+            self._out = bytearray(3 * num_leds)
+        self.compositor = Compositor(num_leds, order, OFF)
+
+        # Frame buffer render mode: writes only touch the layers and mark the
+        # changed range dirty, the render thread pushes at most one frame per tick.
+        self.buffered = buffered
+        self.fps = fps
+        self.strip_writes = 0
+        self._dirty: list[tuple[int, int]] = []
+        self._traces: list[int] = []  # input traces waiting for the frame that shows their change
+        self._frame_lock = threading.Lock()
+        self._frame_ready = clock.Event()
+
+        # Animations run on the same render clock as the frame buffer
+        self.animator = Animator(self._frame_ready)
+        self._render_thread = clock.start_thread(self._render_loop, "LED")
+
+    @property
+    def animation_lock(self) -> bool:
+        return self.animator.is_locked(0, self.num_leds)
+
+    def _render_loop(self):
+        while True:
+            deadline = self.animator.next_deadline()
+            timeout = None if deadline is None else max(0.0, deadline - clock.monotonic())
+            self._frame_ready.wait(timeout)
+            frame_start = clock.monotonic()
+            self.animator.tick(frame_start)
+            self.show()
+            remaining = 1 / self.fps - (clock.monotonic() - frame_start)
+            if self.buffered and remaining > 0:
+                clock.sleep(remaining)
+
+    def show(self):
+        changed = False
+        token = watchdog.arm("LED frame", HARDWARE_DEADLINE, safe=False)
+        with self._frame_lock:
+            self._frame_ready.clear()
+            dirty, self._dirty = self._dirty, []
+            traces, self._traces = self._traces, []
+            for start, end in dirty:
+                if self.compositor.render(self._out, start, end):
+                    changed = True
+                    if not self._direct:
+                        self._copy_to_pixels(start, end)
+            if changed and self.strip is not None:
+                self.strip.publish(self._out)  # a memory copy, cheap enough to hold the lock for
+        if changed:
+            if self.strip is None:
+                self.pixels.show()
+            self.strip_writes += 1
+            LED_STRIP_WRITES.inc()
+            if traces:
+                tracer.mark_all(traces, LED_STAGE)
+        watchdog.disarm(token)
+
+    def _copy_to_pixels(self, start: int, end: int):
+        out = self._out
+        for led in range(start, end):
+            self.pixels[led] = (out[3 * led], out[3 * led + 1], out[3 * led + 2])
+
+    def _segment(self, start_led: int = 0, end_led: int = None) -> tuple[int, int]:
+        start_led, end_led, _ = slice(start_led, end_led).indices(self.num_leds)
+        return start_led, end_led
+
+    def _span(self, segment: str, start_led: int, end_led: int) -> tuple[int, int]:
+        if segment is not None:
+            return self.segments[segment].start, self.segments[segment].end
+        return self._segment(start_led, end_led)
+
+    def _invalidate(self, start_led: int = 0, end_led: int = None):
+        if end_led is None:
+            end_led = self.num_leds
+        with self._frame_lock:
+            self._dirty.append((start_led, end_led))
+        self._request_frame()
+
+    def _request_frame(self):
+        if self.buffered:
+            self._frame_ready.set()
+        else:
+            self.show()
+
+    def _write(self, layer: int, color: tuple, start_led: int, end_led: int):
+        with self._frame_lock:
+            if not self.compositor.fill(layer, start_led, end_led, color):
+                return
+            self._dirty.append((start_led, end_led))
+            if tracer.current:
+                self._traces.extend(tracer.current)
+        if recorder.active:
+            recorder.record(REC_LED, self.station_id, start_led, end_led, layer, pack_color(color))
+        self._request_frame()
+
+    def _clear(self, layer: int, start_led: int, end_led: int):
+        with self._frame_lock:
+            if not self.compositor.clear(layer, start_led, end_led):
+                return
+            self._dirty.append((start_led, end_led))
+            if tracer.current:
+                self._traces.extend(tracer.current)
+        if recorder.active:
+            recorder.record(REC_LED, self.station_id, start_led, end_led, layer, -1)
+        self._request_frame()
+
+    def add_segment(self, name: str, start_led: int, end_led: int, layer: int = BASE_LAYER) -> Segment:
+        start_led, end_led = self._segment(start_led, end_led)
+        self.segments[name] = Segment(name, start_led, end_led, layer)
+        return self.segments[name]
+
+    def set_segment(self, name: str, color: tuple[int, int, int]):
+        segment = self.segments[name]
+        self._write(segment.layer, color, segment.start, segment.end)
+
+    def clear_segment(self, name: str):
+        segment = self.segments[name]
+        self._clear(segment.layer, segment.start, segment.end)
 
     def set_color(self, color: tuple[int, int, int], start_led: int = 0, end_led: int = None):
-        if self.animation_lock:
-            return
-        self._color = color
-        self._apply_color(start_led, end_led)
-        
-    def blink(self, speed: float = 0.1, amount: int = 3):
-        for _ in range(amount):
-            self.turn_off()
-            time.sleep(speed)
-            self.turn_on()
-            time.sleep(speed)
-
-    def sinus(self, period: float = 1, cycles: int = 3, steps: int = 7, start_led: int = 0, end_led: int = None):
-        self.animation_lock = True
-        brightness_before = self._brightness
-        self._state = True
-        for _ in range(cycles):
-            for i in range(steps):
-                angle = (i / steps) * 2 * math.pi
-                self._brightness = 0.5 * (1 - math.cos(angle))  # sine wave 0..1
-                self._apply_color(start_led, end_led)
-                time.sleep(period / steps)
-        self.set_brightness(brightness_before, start_led, end_led)
-        self.animation_lock = False
-
-    def load_bar(self, delay: float = 0.025, start_led: int = 0, end_led: int = None):
-        self._state = True
-        r, g, b = self._color
-        r *= self._brightness
-        g *= self._brightness
-        b *= self._brightness
-        self.set_color((0, 0, 0), start_led, end_led)
-        for i in range(start_led, end_led if end_led is not None else self.num_leds):
-            self.pixels[i] = (r, g, b)
-            time.sleep(delay)
+        """Colours a range on the base layer, segments on higher layers stay in front of it."""
+        self._write(BASE_LAYER, color, *self._segment(start_led, end_led))
+
+    def color_at(self, led: int) -> tuple[int, int, int]:
+        """Raw colour shown at the LED, not counting animations."""
+        with self._frame_lock:
+            return self.compositor.color_at(led, ANIMATION_LAYER)
+
+    def cancel_animations(self):
+        self.animator.cancel_all()
+
+    def blink(self, speed: float = 0.1, amount: int = 3, start_led: int = 0, end_led: int = None,
+              on_done=None, segment: str = None) -> Animation:
+        start_led, end_led = self._span(segment, start_led, end_led)
+
+        def frames():
+            try:
+                for _ in range(amount):
+                    self._write(ANIMATION_LAYER, (0, 0, 0), start_led, end_led)
+                    yield speed
+                    self._clear(ANIMATION_LAYER, start_led, end_led)
+                    yield speed
+            finally:
+                self._clear(ANIMATION_LAYER, start_led, end_led)
+
+        return self.animator.start(frames(), start_led, end_led, on_done)
+
+    def sinus(self, period: float = 1, cycles: int = 3, steps: int = 7, start_led: int = 0, end_led: int = None,
+              on_done=None, segment: str = None, color: tuple = None) -> Animation:
+        start_led, end_led = self._span(segment, start_led, end_led)
+        self.turn_on()
+        if color is None:
+            color = self.color_at(start_led)
+        levels = [0.5 * (1 - math.cos((i / steps) * 2 * math.pi)) for i in range(steps)]  # sine wave 0..1
+        shades = [tuple(int(c * level) for c in color) for level in levels]
+
+        def frames():
+            try:
+                for _ in range(cycles):
+                    for shade in shades:
+                        self._write(ANIMATION_LAYER, shade, start_led, end_led)
+                        yield period / steps
+            finally:
+                self._clear(ANIMATION_LAYER, start_led, end_led)
+
+        return self.animator.start(frames(), start_led, end_led, on_done)
+
+    def load_bar(self, delay: float = 0.025, start_led: int = 0, end_led: int = None,
+                 on_done=None, segment: str = None, color: tuple = None) -> Animation:
+        start_led, end_led = self._span(segment, start_led, end_led)
+        self.turn_on()
+        if color is None:
+            color = self.color_at(start_led)
+
+        def frames():
+            try:
+                self._write(ANIMATION_LAYER, (0, 0, 0), start_led, end_led)
+                for i in range(start_led, end_led):
+                    self._write(ANIMATION_LAYER, color, i, i + 1)
+                    yield delay
+            finally:
+                self._clear(ANIMATION_LAYER, start_led, end_led)
+
+        return self.animator.start(frames(), start_led, end_led, on_done)
+
+    def _update_lut(self):
+        with self._frame_lock:
+            self.compositor.lut = self._lut if self._state else OFF
+        self._invalidate()
 
     def turn_on(self):
-        self._state = True
-        self._apply_color(0, self.num_leds)
+        if not self._state:
+            self._state = True
+            self._update_lut()
 
     def turn_off(self):
-        self._state = False
-        self._apply_color(0, self.num_leds)
-        
-    def set_brightness(self, brightness: float, start_led: int = 0, end_led: int = None):
+        """Blanks the strip, the layers keep their content for the next turn_on."""
+        if self._state:
+            self._state = False
+            self._update_lut()
+
+    def set_brightness(self, brightness: float, *, gamma: float = None):
         brightness = max(0.0, min(1.0, brightness))
-        if self._brightness == brightness:
+        if gamma is None:
+            gamma = self.gamma
+        if self._brightness == brightness and self.gamma == gamma:
             return
         self._brightness = brightness
-        self._apply_color(start_led, end_led)
+        self.gamma = gamma
+        self._lut = color_lut(brightness, gamma)
+        self._update_lut()
 
 
 class Speaker:
@@ -140,41 +513,110 @@ class Speaker:
 
 
 class Button:
-    def __init__(self, pi, io: int):
+    def __init__(self, pi, io: int, debounce_ms: float = 20, long_press: float = 1.0):
         self.logger = logging.getLogger("Button")
         self.io = io
         self.pi = pi
-        self._stop_event = threading.Event()
+        self.debounce_ms = debounce_ms
+        self.long_press = long_press
+        self.on_press = None
+        self.on_release = None
+        self.on_long_press = None
+        self.pressed = False
+        self.press_time = 0.0
+        self.long_press_fired = False
+        self._callback = None
         self.pi.set_mode(self.io, 0)  # 0 = INPUT
 
     def is_pressed(self) -> bool:
         return self.pi.read(self.io) == 1
 
-    def enable_interrupt(self, callback, poll_interval: float = 0.5):
-        def _poll():
-            last_state = self.is_pressed()
-            while not self._stop_event.is_set():
-                state = self.is_pressed()
-                if state != last_state:
-                    callback()
-                last_state = state
-                time.sleep(poll_interval)
 
-        self._stop_event.clear()
-        interrupt_thread = threading.Thread(target=_poll, daemon=True)
-        interrupt_thread.start()
-        return interrupt_thread
+class ButtonManager:
+    """Edge driven input for all buttons.
+
+    pigpio reports edges from its own thread, the glitch filter debounces them
+    per pin. One dispatch thread turns the edges into press, release and
+    long-press callbacks, so handlers should return quickly.
+    """
+
+    def __init__(self, pi):
+        self.logger = logging.getLogger("ButtonManager")
+        self.pi = pi
+        self._buttons: dict[int, Button] = {}
+        self._edges = clock.Queue()
+        self._dispatch_thread = clock.start_thread(self._dispatch, "ButtonManager")
+
+    def add(self, button: Button, on_press=None, on_release=None, on_long_press=None):
+        button.on_press = on_press
+        button.on_release = on_release
+        button.on_long_press = on_long_press
+        button.pressed = button.is_pressed()
+        self._buttons[button.io] = button
+        self.pi.set_glitch_filter(button.io, int(button.debounce_ms * 1000))
+        button._callback = self.pi.callback(button.io, pigpio.EITHER_EDGE, self._edge)
+
+    def remove(self, button: Button):
+        if button._callback is not None:
+            button._callback.cancel()
+            button._callback = None
+        self._buttons.pop(button.io, None)
+
+    def _edge(self, gpio: int, level: int, tick: int):
+        self._edges.put((gpio, level, clock.monotonic()))
+
+    def _next_long_press(self):
+        deadlines = [b.press_time + b.long_press for b in self._buttons.values()
+                     if b.pressed and not b.long_press_fired and b.on_long_press is not None]
+        if not deadlines:
+            return None
+        return max(0.0, min(deadlines) - clock.monotonic())
+
+    def _dispatch(self):
+        while True:
+            try:
+                gpio, level, now = self._edges.get(timeout=self._next_long_press())
+            except queue.Empty:
+                gpio, level, now = None, None, clock.monotonic()
+
+            button = self._buttons.get(gpio)
+            if button is not None and level in (0, 1):  # 2 = watchdog timeout, no level change
+                self._handle_edge(button, level == 1, now)
+
+            for button in list(self._buttons.values()):
+                if button.pressed and not button.long_press_fired and button.on_long_press is not None \
+                        and now - button.press_time >= button.long_press:
+                    button.long_press_fired = True
+                    self._fire(button.on_long_press)
+
+    def _handle_edge(self, button: Button, pressed: bool, now: float):
+        if pressed == button.pressed:
+            return
+        button.pressed = pressed
+        if pressed:
+            button.press_time = now
+            button.long_press_fired = False
+            self._fire(button.on_press)
+        else:
+            self._fire(button.on_release)
 
-    def disable_interrupt(self):
-        self._stop_event.set()
+    def _fire(self, handler):
+        if handler is None:
+            return
+        try:
+            handler()
+        except Exception:
+            self.logger.exception("Button handler failed")
 
 
 class MiuzeiDigitalServo:  # 20kg Servo
     def __init__(self, pi, io: int, min_angle: float = 0.0, max_angle: float = 270.0,
-                 min_pulse: int = 500, max_pulse: int = 2500):
+                 min_pulse: int = 500, max_pulse: int = 2500, seconds_per_degree: float = 0.0025,
+                 settle_margin: float = 0.15):
         self.logger = logging.getLogger("MiuzeiDigitalServo")
         self.pi = pi
         self.io = io
+        self.station_id = 0
         self.min_angle = min_angle
         self.max_angle = max_angle
         self.min_pulse = min_pulse
@@ -184,76 +626,258 @@ class MiuzeiDigitalServo:  # 20kg Servo
         self.eject_angle = 120
         self.normal_angle = 165
 
+        # ~0.16 s / 60° unter Last, plus Reserve bis die Position gehalten wird
+        self.seconds_per_degree = seconds_per_degree
+        self.settle_margin = settle_margin
+        self.ramp_step = 0.02  # one servo frame at 50 Hz
+
         # Set GPIO as output (pigpio handles PWM on it)
         self.pi.set_mode(self.io, 1)  # 1 = OUTPUT
 
+        # Motion commands run one after another on a worker thread, callers get a Future
+        self._commands = clock.Queue()
+        self._worker = clock.start_thread(self._run_commands, "Servo")
+
     def _angle_to_pulse(self, angle: float) -> int:
         angle = max(self.min_angle, min(self.max_angle, angle))  # clamp
         pulse = int(self.min_pulse + (angle - self.min_angle) *
                     (self.max_pulse - self.min_pulse) / (self.max_angle - self.min_angle))
         return pulse
 
-    def rotate_to(self, angle: float):
-        self.logger.debug(f"moving servo to angle {angle}")
+    def settle_time(self, angle: float) -> float:
+        if self.current_angle is None:
+            delta = self.max_angle - self.min_angle  # unknown start, assume full travel
+        else:
+            delta = abs(angle - self.current_angle)
+        return delta * self.seconds_per_degree + self.settle_margin
+
+    def _submit(self, action, *args) -> Future:
+        future = Future()
+        self._commands.put((action, args, future))
+        return future
+
+    def _run_commands(self):
+        while True:
+            action, args, future = self._commands.get()
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                action(*args)
+                future.set_result(None)
+            except Exception as e:
+                self.logger.exception("Servo command failed")
+                future.set_exception(e)
+
+    def rotate_to(self, angle: float, speed: float = None) -> Future:
+        """Queues a move, speed in degrees per second ramps the motion instead of jumping."""
+        return self._submit(self._move, angle, speed)
+
+    def hold(self, seconds: float) -> Future:
+        return self._submit(clock.sleep, seconds)
+
+    def _move(self, angle: float, speed: float = None):
+        self.logger.debug("moving servo to angle %s", angle)
+        if speed and self.current_angle is not None:
+            start = self.current_angle
+            steps = int(abs(angle - start) / speed / self.ramp_step)
+            for i in range(1, steps):
+                self.pi.set_servo_pulsewidth(self.io, self._angle_to_pulse(start + (angle - start) * i / steps))
+                self.current_angle = start + (angle - start) * i / steps
+                clock.sleep(self.ramp_step)
         pulse = self._angle_to_pulse(angle)
-        self.logger.debug(f"Rotating to {angle:.1f}° → pulse {pulse}µs")
-        self.pi.set_servo_pulsewidth(self.io, pulse)
-        self.current_angle = angle
-        time.sleep(1)  # give servo time to move
-        self.stop()
+        settle = self.settle_time(angle)
+        self.logger.debug("Rotating to %.1f° → pulse %dµs, settle %.2fs", angle, pulse, settle)
+        with watchdog.watch("Servo", settle + HARDWARE_DEADLINE, safe=False):
+            self.pi.set_servo_pulsewidth(self.io, pulse)
+            recorder.record(REC_SERVO, self.station_id, self.io, value=angle)
+            self.current_angle = angle
+            clock.sleep(settle)  # give servo time to move
+            self.stop()
 
     def stop(self):
         self.logger.debug("Stopping servo PWM output")
         self.pi.set_servo_pulsewidth(self.io, 0)
 
-    def eject(self):
-        self.rotate_to(self.eject_angle)
+    def eject(self) -> Future:
+        SERVO_EJECTS.inc()
+        return self.rotate_to(self.eject_angle)
 
-    def reset(self):
-        self.rotate_to(self.normal_angle)
+    def reset(self) -> Future:
+        return self.rotate_to(self.normal_angle)
 
-    def eject_and_reset(self):
+    def eject_and_reset(self) -> Future:
         self.logger.debug("Eject and reset triggered!")
         self.eject()
-        time.sleep(1)
-        self.reset()
+        self.hold(1)
+        return self.reset()
+
+
+class RingBuffer:
+    """Fixed-size ring of raw ADC counts with O(1) running sums.
+
+    The writer publishes (count, sum, index-weighted sum, ema, latest) as one
+    tuple, so readers get a consistent snapshot without taking a lock.
+    """
+
+    def __init__(self, size: int, ema_alpha: float = 0.1):
+        self.size = size
+        self.ema_alpha = ema_alpha
+        self.values = array.array("i", [0] * size)
+        self.written = 0  # total samples ever pushed, also the absolute index of the next one
+        self._sum = 0
+        self._weighted = 0  # sum of absolute_index * value over the window
+        self._ema = 0.0
+        self.snapshot = (0, 0, 0, 0.0, 0)
+
+    def push(self, value: int):
+        slot = self.written % self.size
+        if self.written >= self.size:
+            old = self.values[slot]
+            self._sum -= old
+            self._weighted -= (self.written - self.size) * old
+        self.values[slot] = value
+        self._sum += value
+        self._weighted += self.written * value
+        self._ema = value if self.written == 0 else self._ema + self.ema_alpha * (value - self._ema)
+        self.written += 1
+        self.snapshot = (self.written, self._sum, self._weighted, self._ema, value)
+
+    def mean(self) -> float:
+        written, total, _, _, _ = self.snapshot
+        count = min(written, self.size)
+        return total / count if count else 0.0
+
+    def median(self) -> float:
+        count = min(self.written, self.size)
+        if not count:
+            return 0.0
+        window = sorted(self.values[:count])
+        middle = count // 2
+        return window[middle] if count % 2 else (window[middle - 1] + window[middle]) / 2
+
+    def slope(self) -> float:
+        """Least-squares slope of the window in counts per sample."""
+        written, total, weighted, _, _ = self.snapshot
+        n = min(written, self.size)
+        if n < 2:
+            return 0.0
+        weighted -= (written - n) * total  # shift x so the window starts at 0
+        sum_x = n * (n - 1) / 2
+        sum_x2 = (n - 1) * n * (2 * n - 1) / 6
+        return (n * weighted - sum_x * total) / (n * sum_x2 - sum_x ** 2)
 
 
 class PressureSensor:
-    def __init__(self, channel: int, pressure_max: float = 1.32, adc_gain: int = 1, v_ref: float = 3.3):
+    def __init__(self, channel: int, pressure_max: float = 1.32, adc_gain: int = 1, v_ref: float = 3.3,
+                 sps: int = 128, window: int = 64, ema_alpha: float = 0.1, address: int = 0x48):
         self.logger = logging.getLogger("DruckSensor")
         self.channel = channel
         self.pressure_max = pressure_max
         self.v_ref = v_ref
-        self.adc = Adafruit_ADS1x15.ADS1115(address=0x48, busnum=channel)
+        self.address = address  # ADDR-Pin: 0x48 GND, 0x49 VDD, 0x4A SDA, 0x4B SCL
+        self.station_id = 0
+        self.adc = Adafruit_ADS1x15.ADS1115(address=address, busnum=channel)
         self.gain = adc_gain
 
         self.adc_max = 32767  # 16-bit signed
 
+        # Continuous mode: der ADC wandelt selbst mit sps, ein Thread liest nur das Ergebnisregister
+        self.sps = sps
+        self.samples = RingBuffer(window, ema_alpha)
+        self._sampling = threading.Event()
+        self._sampler_thread = None
+        self.available = False  # samples are fresh, False before start_sampling and after a failed read
+
+    def start_sampling(self):
+        if self._sampling.is_set():
+            return
+        self.adc.start_adc(self.channel, gain=self.gain, data_rate=self.sps)
+        self.available = True
+        self._sampling.set()
+        self._sampler_thread = clock.start_thread(self._sample_loop, "PressureSensor")
+
+    def stop_sampling(self):
+        self.available = False
+        self._sampling.clear()
+        if self._sampler_thread is not None:
+            clock.join(self._sampler_thread)
+            self._sampler_thread = None
+        self.adc.stop_adc()
+
+    def _sample_loop(self):
+        period = 1 / self.sps
+        next_sample = clock.monotonic()
+        while self._sampling.is_set():
+            try:
+                with watchdog.watch("PressureSensor", HARDWARE_DEADLINE):
+                    raw = self.adc.get_last_result()
+            except OSError as e:
+                self.available = False
+                self._sampling.clear()
+                self.logger.error(f"Reading the ADC failed ({e}), pressure sensor unavailable until restarted.")
+                return
+            self.samples.push(raw)
+            recorder.record(REC_PRESSURE, self.station_id, self.address, extra=raw)
+            PRESSURE.observe(self.voltage_to_pressure(self.raw_to_voltage(raw)))
+            next_sample += period
+            delay = next_sample - clock.monotonic()
+            if delay > 0:
+                clock.sleep(delay)
+            else:
+                next_sample = clock.monotonic()
+
+    def raw_to_voltage(self, raw: float) -> float:
+        # ±4.096 V bei gain=1 → 1 Bit = 0.125 mV
+        return raw * 4.096 / self.adc_max
+
+    def voltage_to_pressure(self, voltage: float) -> float:
+        if voltage < 0.5:  # Unterhalb Sensor-Offset → Fehler
+            return 0.0
+        if voltage > 4.5:  # Oberhalb → Clamping
+            voltage = 4.5
+        return ((voltage - 0.5) / 4.0) * self.pressure_max
+
     def read_voltage(self) -> float:
         raw = self.adc.read_adc(self.channel, gain=self.gain)
-        # ±4.096 V bei gain=1 → 1 Bit = 0.125 mV
-        voltage = raw * 4.096 / self.adc_max
-        self.logger.debug(f"ADC raw: {raw}, Voltage: {voltage:.3f} V")
+        voltage = self.raw_to_voltage(raw)
+        self.logger.debug("ADC raw: %s, Voltage: %.3f V", raw, voltage)
         return voltage
 
     def read_pressure(self) -> float:
         """Rechnet Spannung in Druck um (PSI)."""
         voltage = self.read_voltage()
-        if voltage < 0.5:  # Unterhalb Sensor-Offset → Fehler
-            return 0.0
-        if voltage > 4.5:  # Oberhalb → Clamping
-            voltage = 4.5
-        pressure = ((voltage - 0.5) / 4.0) * self.pressure_max
-        self.logger.debug(f"Voltage: {voltage:.3f} V → Pressure: {pressure:.2f} PSI")
+        pressure = self.voltage_to_pressure(voltage)
+        self.logger.debug("Voltage: %.3f V → Pressure: %.2f PSI", voltage, pressure)
         return pressure
 
     def read_average_pressure(self, samples: int = 5, delay: float = 0.05) -> float:
         """Mittelwert mehrerer Messungen (Glättung)."""
+        if self._sampling.is_set():
+            return self.average_pressure()
         values = []
         for _ in range(samples):
             values.append(self.read_pressure())
-            time.sleep(delay)
+            clock.sleep(delay)
         avg = sum(values) / len(values)
-        self.logger.debug(f"Average pressure: {avg:.2f} PSI")
+        self.logger.debug("Average pressure: %.2f PSI", avg)
         return avg
+
+    def latest_pressure(self) -> float:
+        """Letzter Messwert aus dem Ringpuffer, blockiert nicht."""
+        return self.voltage_to_pressure(self.raw_to_voltage(self.samples.snapshot[4]))
+
+    def average_pressure(self) -> float:
+        """Gleitender Mittelwert über das Fenster (PSI)."""
+        return self.voltage_to_pressure(self.raw_to_voltage(self.samples.mean()))
+
+    def median_pressure(self) -> float:
+        """Median über das Fenster, robust gegen einzelne Ausreißer (PSI)."""
+        return self.voltage_to_pressure(self.raw_to_voltage(self.samples.median()))
+
+    def ema_pressure(self) -> float:
+        """Exponentiell geglätteter Druck (PSI)."""
+        return self.voltage_to_pressure(self.raw_to_voltage(self.samples.snapshot[3]))
+
+    def pressure_slope(self) -> float:
+        """Druckanstieg in PSI pro Sekunde (lineare Regression über das Fenster)."""
+        return self.raw_to_voltage(self.samples.slope()) / 4.0 * self.pressure_max * self.sps
@@ -0,0 +1,206 @@
+import array
+import logging
+import threading
+
+from src.Clock import clock
+from src.Events import INPUT
+from src.Tracing import tracer, STATE, PICKUP
+
+PRESSED = b"0"
+
+MQTT_HOST = "192.168.4.1"
+MQTT_PORT = 1883
+MQTT_MIN_DELAY = 1
+MQTT_MAX_DELAY = 30
+
+
+def input_topics(prefix: str = "", players: tuple = (1, 2, 3, 4)) -> dict[str, int]:
+    return {f"{prefix}Pico{player}/Eingabe": player for player in players}
+
+
+def input_subscription(prefix: str = "") -> str:
+    """One wildcard subscription covers all Picos of a station."""
+    return f"{prefix}+/Eingabe"
+
+
+INPUT_TOPICS = input_topics()
+
+
+class InputState:
+    """Player presses, written by the network thread and read lock-free by the game loop.
+
+    Every press gets a global sequence number, stored per player together with
+    its monotonic timestamp. The loop never mutates writer state: clear() only
+    remembers the current sequence, so a press can neither be lost nor counted
+    twice when it races with a clear.
+    """
+
+    def __init__(self, players: tuple[int, ...] = (1, 2, 3, 4)):
+        self.players = tuple(players)
+        size = max(self.players) + 1
+        self.sequence = 0
+        self.press_sequence = array.array("Q", [0] * size)
+        self.press_time = array.array("d", [0.0] * size)
+        self.press_trace = array.array("Q", [0] * size)  # trace id of the last press, 0 = not traced
+        self.cleared = 0
+        self._write_lock = threading.Lock()  # only between writers, readers never take it
+
+    def press(self, player: int, trace: int = 0):
+        with self._write_lock:
+            sequence = self.sequence + 1
+            self.press_time[player] = clock.monotonic()
+            self.press_trace[player] = trace
+            self.press_sequence[player] = sequence
+            self.sequence = sequence  # publish last, readers only trust sequences <= self.sequence
+
+    def tick(self) -> int:
+        return self.sequence
+
+    def pressed_since(self, tick: int) -> list[int]:
+        return [player for player in self.players if self.press_sequence[player] > tick]
+
+    def clear(self, tick: int = None) -> int:
+        """Forgets the presses up to tick (default: all so far), later ones stay visible."""
+        self.cleared = self.sequence if tick is None else tick
+        return self.cleared
+
+    def count(self, tick: int = None) -> int:
+        """Players that pressed since the last clear, up to tick if given."""
+        if tick is None:
+            tick = self.sequence
+        return sum(1 for player in self.players if self.cleared < self.press_sequence[player] <= tick)
+
+    def __getitem__(self, player: int) -> bool:
+        return self.press_sequence[player] > self.cleared
+
+    def __iter__(self):
+        return iter(self.players)
+
+    def __repr__(self):
+        return "{" + ", ".join(f"{player}: {self[player]}" for player in self.players) + "}"
+
+
+class InputPipeline:
+    """Turns Pico MQTT messages into player presses for the game loop.
+
+    Runs in the paho network thread: one dict lookup per message, a press is
+    the edge into PRESSED and is recorded in the InputState. Only the first
+    press per loop tick posts an INPUT event, the loop drains the rest.
+    """
+
+    def __init__(self, events, state: InputState, topics: dict[str, int] = None):
+        self.logger = logging.getLogger("InputPipeline")
+        self.events = events
+        self.state = state
+        self.topics = dict(INPUT_TOPICS if topics is None else topics)
+        self.previous_payload: dict[str, bytes] = {}
+        self._drained = 0
+        self._posted = False
+        self._lock = threading.Lock()
+
+    def on_message(self, topic: str, payload: bytes):
+        """Returns the player number if the message is a new press, otherwise None."""
+        player = self.topics.get(topic)
+        if player is None:
+            return None
+        state = payload[:1]  # anything after the first byte (e.g. a load-test timestamp) is ignored
+        previous = self.previous_payload.get(topic)
+        self.previous_payload[topic] = state
+        if state != PRESSED or previous == PRESSED:
+            return None
+
+        trace = tracer.begin(player) if tracer.enabled else 0
+        self.state.press(player, trace)
+        if trace:
+            tracer.mark(trace, STATE, player)
+        with self._lock:
+            post = not self._posted
+            self._posted = True
+        if post:
+            self.events.post(INPUT)
+        return player
+
+    def drain(self) -> list[int]:
+        """Players that pressed since the last drain, in player order."""
+        with self._lock:
+            self._posted = False
+        tick = self.state.tick()
+        players = [player for player in self.state.pressed_since(self._drained)
+                   if self.state.press_sequence[player] <= tick]
+        self._drained = tick
+        if tracer.enabled:
+            traces = tuple(trace for trace in (self.state.press_trace[player] for player in players) if trace)
+            tracer.mark_all(traces, PICKUP)
+            tracer.current = traces  # the game loop clears it once it has handled the presses
+        return players
+
+
+class MQTTRouter:
+    """One MQTT client shared by all stations.
+
+    Each station adds a route: its wildcard subscription plus the exact topics it
+    handles. Messages are dispatched with a single dict lookup on the topic, in
+    the paho network thread. The client connects in the background with paho's
+    exponential backoff and renews all subscriptions on every (re)connect.
+    """
+
+    def __init__(self, client, host: str = MQTT_HOST, port: int = MQTT_PORT):
+        self.logger = logging.getLogger("MQTTRouter")
+        self.client = client
+        self.host = host
+        self.port = port
+        self.routes: dict[str, object] = {}
+        self.subscriptions: set[str] = set()
+        self.listeners = []
+        self.connected = False
+        self._started = False
+
+    def add_route(self, subscription: str, topics, handler):
+        """handler(client, userdata, msg) gets every message on one of topics."""
+        for topic in topics:
+            self.routes[topic] = handler
+        self.subscriptions.add(subscription)
+        if self.connected:
+            self.client.subscribe(subscription)
+
+    def add_listener(self, listener):
+        """listener(connected) is called from the network thread whenever the connection changes."""
+        self.listeners.append(listener)
+
+    def start(self, username: str = "PicoNet", password: str = "geheimespasswort"):
+        if self._started:
+            return
+        self._started = True
+        self.client.username_pw_set(username=username, password=password)
+        self.client.on_message = self.on_message
+        self.client.on_connect = self.on_connect
+        self.client.on_disconnect = self.on_disconnect
+        self.client.reconnect_delay_set(min_delay=MQTT_MIN_DELAY, max_delay=MQTT_MAX_DELAY)
+        self.logger.info("Connecting to MQTT broker %s:%d in the background.", self.host, self.port)
+        self.client.connect_async(self.host, self.port, 60)
+        self.client.loop_start()
+
+    def on_message(self, client, userdata, msg):
+        handler = self.routes.get(msg.topic)
+        if handler is not None:
+            handler(client, userdata, msg)
+
+    def on_connect(self, client, userdata, flags, rc):
+        if rc != 0:
+            self.logger.warning(f"MQTT broker refused the connection (rc={rc}).")
+            return
+        # Subscriptions do not survive a reconnect with a clean session, so renew them every time
+        for subscription in self.subscriptions:
+            client.subscribe(subscription)
+        self.connected = True
+        self.logger.info("Connected to MQTT broker.")
+        self._notify()
+
+    def on_disconnect(self, client, userdata, rc):
+        self.connected = False
+        self.logger.warning(f"Lost MQTT broker (rc={rc}), Pico inputs are unavailable until it is back.")
+        self._notify()
+
+    def _notify(self):
+        for listener in self.listeners:
+            listener(self.connected)
@@ -0,0 +1,278 @@
+import bisect
+import logging
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from src.Clock import clock
+
+# Default histogram buckets in seconds, from 10 µs up to one second
+LATENCY_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _CounterValue:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+
+
+class _GaugeValue:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, value: float):
+        self.value = value
+
+
+class _HistogramValue:
+    __slots__ = ("bounds", "counts", "sum", "_lock")
+
+    def __init__(self, bounds: tuple):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+
+class Metric:
+    """One metric family. Without label names it behaves like its only child."""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: dict[tuple, object] = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._default = self.labels()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _samples(self):
+        raise NotImplementedError
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, labels, value in self._samples():
+            lines.append(f"{self.name}{suffix}{labels} {value!r}")
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterValue()
+
+    def inc(self, amount: float = 1.0):
+        self._default.inc(amount)
+
+    def _samples(self):
+        for values, child in list(self._children.items()):
+            yield "", _format_labels(self.labelnames, values), child.value
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def _new_child(self):
+        return _GaugeValue()
+
+    def set(self, value: float):
+        self._default.set(value)
+
+    def _samples(self):
+        for values, child in list(self._children.items()):
+            yield "", _format_labels(self.labelnames, values), child.value
+
+
+class CallbackMetric(Metric):
+    """Counter or gauge whose values are only computed when the metrics are exported."""
+
+    def __init__(self, name: str, documentation: str, kind: str = "gauge"):
+        self.name = name
+        self.documentation = documentation
+        self.kind = kind
+        self.functions: dict[tuple, object] = {}  # ((label, value), ...) -> function
+
+    def _samples(self):
+        for labels, function in list(self.functions.items()):
+            names = tuple(name for name, _ in labels)
+            values = tuple(value for _, value in labels)
+            yield "", _format_labels(names, values), float(function())
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value: float):
+        self._default.observe(value)
+
+    def _samples(self):
+        for values, child in list(self._children.items()):
+            with child._lock:
+                counts, total = list(child.counts), child.sum
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                yield "_bucket", _format_labels(self.labelnames, values, f'le="{le}"'), cumulative
+            yield "_sum", _format_labels(self.labelnames, values), total
+            yield "_count", _format_labels(self.labelnames, values), cumulative
+
+
+class Registry:
+    """Holds all metrics of the process and renders them in the Prometheus text format.
+
+    Metrics are registered once at import time and then updated from the hot paths,
+    which only costs a dict lookup and a lock. Registering a name again returns the
+    existing metric, except for callbacks, where the newest function per label set wins.
+    """
+
+    def __init__(self):
+        self.logger = logging.getLogger("Metrics")
+        self._metrics: dict[str, Metric] = {}
+        self._lock = threading.Lock()
+        self._server = None
+        self._writer_running = threading.Event()
+
+    def _register(self, cls, name: str, *args, **kwargs) -> Metric:
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name} is already registered as {metric.kind}")
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: tuple = ()) -> Counter:
+        return self._register(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: tuple = ()) -> Gauge:
+        return self._register(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name: str, documentation: str, labelnames: tuple = (),
+                  buckets: tuple = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram, name, documentation, labelnames, buckets)
+
+    def callback(self, name: str, documentation: str, function, kind: str = "gauge",
+                 labels: dict = None) -> CallbackMetric:
+        with self._lock:
+            metric = self._metrics.get(name)
+            if not isinstance(metric, CallbackMetric):
+                metric = self._metrics[name] = CallbackMetric(name, documentation, kind)
+            metric.functions[tuple(sorted((labels or {}).items()))] = function
+            return metric
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            try:
+                lines.extend(metric.render())
+            except Exception as e:
+                self.logger.warning(f"Could not export {metric.name}: {e}")
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path: str):
+        """Writes the metrics atomically, for the node_exporter textfile collector."""
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as file:
+            file.write(self.render())
+        os.replace(tmp, path)
+
+    def start_textfile_writer(self, path: str, interval: float = 5.0):
+        if self._writer_running.is_set():
+            return
+        self._writer_running.set()
+
+        def write_loop():
+            while self._writer_running.is_set():
+                try:
+                    self.write_textfile(path)
+                except OSError as e:
+                    self.logger.warning(f"Could not write metrics to {path}: {e}")
+                clock.sleep(interval)
+
+        clock.start_thread(write_loop, "MetricsWriter")
+
+    def serve(self, port: int = 9108, host: str = "127.0.0.1"):
+        """Serves /metrics over HTTP on localhost from a background thread."""
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = registry.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="MetricsServer", daemon=True).start()
+        self.logger.info(f"Serving metrics on http://{host}:{self._server.server_port}/metrics")
+        return self._server
+
+    def stop(self):
+        self._writer_running.clear()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+metrics = Registry()
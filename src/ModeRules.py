@@ -0,0 +1,71 @@
+import logging
+
+from src.Config import JsonConfig, config_path, read_json
+
+MODES_FILE = config_path("gamemodes.json")
+
+# When a press leads to a pump pulse
+PRESS = "press"      # any press pumps right away
+PLAYERS = "players"  # at least min_players different players have pressed since the last pulse
+TARGET = "target"    # one player is shown, only that player may press within the window
+
+TRIGGERS = (PRESS, PLAYERS, TARGET)
+
+
+class ModeRules(JsonConfig):
+    """Declarative description of a gamemode, RuleMode turns it into event handlers.
+
+    Times are in seconds, colors are (r, g, b). deflate_delay is how long the
+    balloon waits after a pulse before the release valve opens, None keeps the
+    valve closed (the balloon never shrinks in that mode).
+    """
+
+    def __init__(self, name: str, trigger: str = PRESS, pulse: float = 1.5, min_players: int = 1,
+                 deflate_delay: float = 0.0, window: float = 1.5, retry_delay: float = 0.5,
+                 win_at: float = 1.0, intro_color: tuple = (0, 255, 0), idle_color: tuple = (255, 0, 0),
+                 pump_color: tuple = (0, 255, 0)):
+        if trigger not in TRIGGERS:
+            raise ValueError(f"Unknown trigger '{trigger}', expected one of {TRIGGERS}")
+        self.name = name
+        self.trigger = trigger
+        self.pulse = pulse                  # pump pulse length before fill tapering
+        self.min_players = min_players      # PLAYERS: distinct players needed for a pulse
+        self.deflate_delay = deflate_delay  # after a pulse, None = never deflate
+        self.window = window                # TARGET: time the target player has to press
+        self.retry_delay = retry_delay      # TARGET: pause after a missed round
+        self.win_at = win_at                # fill level that ejects the balloon
+        self.intro_color = tuple(intro_color)
+        self.idle_color = tuple(idle_color)
+        self.pump_color = tuple(pump_color)
+
+    def __repr__(self):
+        return f"ModeRules({self.name!r}, trigger={self.trigger!r}, pulse={self.pulse})"
+
+
+EASY = ModeRules("Easy Mode", trigger=PRESS, pulse=1.5, deflate_delay=0.1, intro_color=(0, 255, 0))
+MEDIUM = ModeRules("Medium Mode", trigger=PLAYERS, pulse=2, min_players=2, intro_color=(0, 0, 255))
+HARD = ModeRules("Hard Mode", trigger=TARGET, pulse=5, deflate_delay=None, window=1.5, retry_delay=0.5,
+                 intro_color=(255, 0, 0))
+
+DEFAULT_MODES = (EASY, MEDIUM, HARD)
+
+
+def load_modes(path: str = MODES_FILE) -> list[ModeRules]:
+    """The mode cycle from gamemodes.json, the built-in Easy/Medium/Hard if there is none.
+
+    Entries with an unknown key or an invalid trigger are logged and skipped.
+    """
+    logger = logging.getLogger("ModeRules")
+    data = read_json(path, logger)
+    if data is None:
+        return list(DEFAULT_MODES)
+    modes = []
+    for entry in data:
+        try:
+            modes.append(ModeRules.from_dict(entry))
+        except (TypeError, ValueError) as e:
+            logger.warning(f"Skipping mode {entry!r} in {path}: {e}")
+    if not modes:
+        logger.warning(f"No usable modes in {path}, using the built-in modes.")
+        return list(DEFAULT_MODES)
+    return modes
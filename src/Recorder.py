@@ -0,0 +1,200 @@
+import logging
+import mmap
+import os
+import struct
+import threading
+
+from src.Clock import clock
+
+# Record kinds
+REC_INPUT = 1     # a: player, b: payload state byte
+REC_PUMP = 2      # a: GPIO, value: 1.0 open / 0.0 closed
+REC_VALVE = 3     # a: GPIO, value: 1.0 open / 0.0 closed
+REC_SERVO = 4     # a: GPIO, value: target angle
+REC_LED = 5       # a: start LED, b: end LED, value: layer, extra: 0xRRGGBB or -1 for cleared
+REC_PRESSURE = 6  # extra: raw ADC value (signed)
+REC_MODE = 7      # a: index in the mode cycle
+REC_BUTTON = 8    # a: button code, see BUTTON_CODES
+REC_TARGET = 9    # a: player shown as the target
+REC_PROFILE = 10  # a: index in PROFILE_FIELDS (PROFILE_START begins a profile), b: 0 low / 1 high word,
+                  # extra: that word of the float64, value: the field rounded to float32 for reading
+
+KIND_NAMES = {REC_INPUT: "input", REC_PUMP: "pump", REC_VALVE: "valve", REC_SERVO: "servo", REC_LED: "led",
+              REC_PRESSURE: "pressure", REC_MODE: "mode", REC_BUTTON: "button", REC_TARGET: "target",
+              REC_PROFILE: "profile"}
+BUTTON_CODES = {"explode": 1, "mode": 2}
+PROFILE_FIELDS = ("baseline", "target_pressure", "pump_rate", "valve_rate", "fill_time", "valve_factor")
+PROFILE_START = 255
+
+MAGIC = b"BGREC\x00\x01\x00"
+HEADER = struct.Struct("<8sdd")          # magic, wall clock at start, monotonic clock at start
+RECORD = struct.Struct("<dBBHHfi")       # time since start, kind, station, a, b, value, extra: 22 bytes
+DOUBLE = struct.Struct("<d")
+DOUBLE_WORDS = struct.Struct("<ii")
+
+
+class Record:
+    __slots__ = ("time", "kind", "station", "a", "b", "value", "extra")
+
+    def __init__(self, time: float, kind: int, station: int, a: int, b: int, value: float, extra: int):
+        self.time = time
+        self.kind = kind
+        self.station = station
+        self.a = a
+        self.b = b
+        self.value = value
+        self.extra = extra
+
+    def __repr__(self):
+        return (f"Record({self.time:.4f}, {KIND_NAMES.get(self.kind, self.kind)}, station={self.station}, "
+                f"a={self.a}, b={self.b}, value={self.value:g}, extra={self.extra})")
+
+
+class SessionRecorder:
+    """Appends fixed-size binary records of everything the game does to a session file.
+
+    Hooks call record() from any thread. While no file is open that is a single
+    attribute check, while recording it packs 22 bytes into a buffered file under
+    a lock. A background thread flushes once per second, so a crash loses at most
+    that much; a torn last record is ignored by the reader.
+    """
+
+    def __init__(self):
+        self.logger = logging.getLogger("Recorder")
+        self.active = False
+        self.path = None
+        self.records = 0
+        self._file = None
+        self._start = 0.0
+        self._lock = threading.Lock()
+        self._stations: dict[str, int] = {}
+        self._stop = None
+        self._flusher = None
+
+    def station_id(self, name: str) -> int:
+        """Small number for a station name, in the order the stations were created."""
+        return self._stations.setdefault(name, len(self._stations))
+
+    def start(self, path: str, flush_interval: float = 1.0):
+        self.stop()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path, "xb")  # one file per session, never overwrite an old one
+        self._start = clock.monotonic()
+        self._file.write(HEADER.pack(MAGIC, clock.time(), self._start))
+        self.path = path
+        self.records = 0
+        self.active = True
+        self.logger.info(f"Recording session to {path}")
+
+        stop = self._stop = clock.Event()
+
+        def flush_loop():
+            while not stop.wait(flush_interval):
+                self.flush()
+
+        self._flusher = clock.start_thread(flush_loop, "RecorderFlush")
+
+    def record(self, kind: int, station: int = 0, a: int = 0, b: int = 0, value: float = 0.0, extra: int = 0):
+        if not self.active:
+            return
+        data = RECORD.pack(clock.monotonic() - self._start, kind, station, a, b, value, extra)
+        with self._lock:
+            if self._file is not None:
+                self._file.write(data)
+                self.records += 1
+
+    def record_profile(self, station: int, profile):
+        """The fields of a BalloonProfile, exact, so a replay estimates the fill like the original."""
+        if not self.active:
+            return
+        self.record(REC_PROFILE, station, PROFILE_START)
+        for index, name in enumerate(PROFILE_FIELDS):
+            value = getattr(profile, name)
+            if value is None:
+                continue
+            low, high = DOUBLE_WORDS.unpack(DOUBLE.pack(value))
+            self.record(REC_PROFILE, station, index, 0, value, low)
+            self.record(REC_PROFILE, station, index, 1, value, high)
+
+    def flush(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+
+    def stop(self):
+        self.active = False
+        if self._flusher is not None:
+            self._stop.set()
+            clock.join(self._flusher, 5.0)  # a restart must not leave the old flush thread behind
+            self._flusher = None
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class SessionReader:
+    """Reads a session file through mmap, records are decoded lazily while iterating."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as file:
+            size = os.fstat(file.fileno()).st_size
+            if size < HEADER.size:
+                raise ValueError(f"{path} is not a session recording")
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.wall_start, self.monotonic_start = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            self._mmap.close()
+            raise ValueError(f"{path} is not a session recording")
+        self.count = (size - HEADER.size) // RECORD.size  # a torn last record is ignored
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __iter__(self):
+        view = memoryview(self._mmap)[HEADER.size:HEADER.size + self.count * RECORD.size]
+        try:
+            for fields in RECORD.iter_unpack(view):
+                yield Record(*fields)
+        finally:
+            view.release()
+
+    def profile(self, station: int = 0) -> dict:
+        """Fields of the last balloon profile recorded for station, {} if there is none."""
+        fields = {}
+        words = {}
+        for rec in self:
+            if rec.kind != REC_PROFILE or rec.station != station:
+                continue
+            if rec.a == PROFILE_START:
+                fields, words = {}, {}
+                continue
+            words.setdefault(rec.a, [0, 0])[rec.b] = rec.extra
+            fields[PROFILE_FIELDS[rec.a]] = DOUBLE.unpack(DOUBLE_WORDS.pack(*words[rec.a]))[0]
+        return fields
+
+    @property
+    def duration(self) -> float:
+        if not self.count:
+            return 0.0
+        return RECORD.unpack_from(self._mmap, HEADER.size + (self.count - 1) * RECORD.size)[0]
+
+    def close(self):
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def pack_color(color: tuple) -> int:
+    r, g, b = color[:3]
+    return (int(r) << 16) | (int(g) << 8) | int(b)
+
+
+recorder = SessionRecorder()
@@ -0,0 +1,491 @@
+import logging
+import math
+import random
+import time
+import types
+
+from src.Clock import clock
+
+PUMP_IO = 17
+VALVE_IO = 27
+SERVO_IO = 13
+
+
+class BalloonModel:
+    """Air volume of the balloon, 1.0 is a full balloon (the old 40 s of pumping)."""
+
+    def __init__(self, pump_rate: float = 1 / 40, valve_rate: float = 1 / 60, pop_at: float = 1.6,
+                 pressure_max: float = 1.32):
+        self.pump_rate = pump_rate
+        self.valve_rate = valve_rate
+        self.pop_at = pop_at
+        self.pressure_max = pressure_max
+        self.volume = 0.0
+        self.pump_open = False
+        self.valve_open = False
+        self.pops = 0
+        self._last = clock.monotonic()
+
+    def _integrate(self):
+        now = clock.monotonic()
+        dt = now - self._last
+        self._last = now
+        if self.pump_open:
+            self.volume += self.pump_rate * dt
+        if self.valve_open:
+            self.volume = max(0.0, self.volume - self.valve_rate * dt)
+        if self.volume > self.pop_at:
+            self.pops += 1
+            self.volume = 0.0
+
+    def set_pump(self, state: bool):
+        self._integrate()
+        self.pump_open = state
+
+    def set_valve(self, state: bool):
+        self._integrate()
+        self.valve_open = state
+
+    def pressure(self) -> float:
+        # Rubber balloon: steep rise, plateau, then it stiffens shortly before popping
+        self._integrate()
+        v = self.volume
+        return min(self.pressure_max, 0.05 + 0.35 * (1 - math.exp(-8 * v)) + 0.25 * v ** 3)
+
+    def replace(self):
+        self._integrate()
+        self.volume = 0.0
+
+
+class SimCallback:
+    def __init__(self, pi, io: int, func):
+        self.pi = pi
+        self.io = io
+        self.func = func
+
+    def cancel(self):
+        if self in self.pi.callbacks.get(self.io, []):
+            self.pi.callbacks[self.io].remove(self)
+
+
+class SimScript:
+    """Runs the small subset of pigpio's script language the actuators use (w, tick, lda, sta, mils, mics)."""
+
+    HALTED = 1
+    RUNNING = 2
+
+    def __init__(self, pi, text: bytes):
+        self.pi = pi
+        self.commands = []
+        tokens = text.decode().split()
+        arity = {"w": 2, "tick": 0, "lda": 1, "sta": 1, "mils": 1, "mics": 1}
+        i = 0
+        while i < len(tokens):
+            name = tokens[i].lower()
+            if name not in arity:
+                raise ValueError(f"Unsupported script command '{name}'")
+            self.commands.append((name, tokens[i + 1:i + 1 + arity[name]]))
+            i += 1 + arity[name]
+        self.params = [0] * 10
+        self.status = self.HALTED
+        self._stop = clock.Event()
+
+    def _value(self, operand: str) -> int:
+        return self.params[int(operand[1:])] if operand[0] == "p" else int(operand)
+
+    def run(self, params: list):
+        self.params[:len(params)] = params
+        self.status = self.RUNNING
+        self._stop = clock.Event()
+        self._execute(self._stop, 0, 0)
+
+    def _execute(self, stop, start: int, accumulator: int):
+        # Runs in the caller up to the first delay like the daemon would, the rest on a clock thread
+        for index in range(start, len(self.commands)):
+            name, args = self.commands[index]
+            if stop.is_set():
+                return
+            if name == "w":
+                self.pi.write(self._value(args[0]), self._value(args[1]))
+            elif name == "tick":
+                accumulator = self.pi.get_current_tick()
+            elif name == "lda":
+                accumulator = self._value(args[0])
+            elif name == "sta":
+                self.params[int(args[0][1:])] = accumulator
+            else:
+                delay = self._value(args[0]) / (1000 if name == "mils" else 1_000_000)
+                clock.start_thread(lambda: stop.wait(delay) or self._execute(stop, index + 1, accumulator),
+                                   "SimScript")
+                return
+        self.status = self.HALTED
+
+    def stop(self):
+        self._stop.set()
+        self.status = self.HALTED
+
+
+class SimPi:
+    def __init__(self, machine):
+        self.machine = machine
+        self.connected = True
+        self.levels: dict[int, int] = {}
+        self.modes: dict[int, int] = {}
+        self.servo_pulses: dict[int, int] = {}
+        self.callbacks: dict[int, list[SimCallback]] = {}
+        self.scripts: dict[int, SimScript] = {}
+        self.writes = 0
+
+    def get_current_tick(self) -> int:
+        return int(clock.monotonic() * 1_000_000) & 0xFFFFFFFF
+
+    def set_mode(self, io: int, mode: int):
+        self.modes[io] = mode
+
+    def read(self, io: int) -> int:
+        return self.levels.get(io, 0)
+
+    def write(self, io: int, level: int):
+        self.writes += 1
+        self.levels[io] = level
+        station = self.machine.by_pin.get(io)
+        if station is None:
+            return
+        if io == station.pump_io:
+            station.balloon.set_pump(bool(level))
+        elif io == station.valve_io:
+            station.balloon.set_valve(bool(level))
+
+    def set_servo_pulsewidth(self, io: int, pulse: int):
+        self.servo_pulses[io] = pulse
+        station = self.machine.by_pin.get(io)
+        if station is not None and io == station.servo_io and 0 < pulse < 1500:  # eject angle, the balloon drops off
+            station.ejects += 1
+            self.machine.ejects += 1
+            station.balloon.replace()
+
+    def store_script(self, script: bytes) -> int:
+        sid = len(self.scripts)
+        self.scripts[sid] = SimScript(self, script)
+        return sid
+
+    def run_script(self, sid: int, params: list = None) -> int:
+        self.scripts[sid].run(params or [])
+        return 0
+
+    def script_status(self, sid: int) -> tuple:
+        script = self.scripts[sid]
+        return script.status, tuple(script.params)
+
+    def stop_script(self, sid: int) -> int:
+        self.scripts[sid].stop()
+        return 0
+
+    def delete_script(self, sid: int) -> int:
+        self.scripts.pop(sid).stop()
+        return 0
+
+    def set_glitch_filter(self, io: int, steady: int):
+        pass
+
+    def callback(self, io: int, edge: int, func) -> SimCallback:
+        cb = SimCallback(self, io, func)
+        self.callbacks.setdefault(io, []).append(cb)
+        return cb
+
+    def set_input(self, io: int, level: int):
+        """Drives an input pin like a physical button would."""
+        if self.levels.get(io, 0) == level:
+            return
+        self.levels[io] = level
+        tick = self.get_current_tick()
+        for cb in list(self.callbacks.get(io, [])):
+            cb.func(io, level, tick)
+
+    def stop(self):
+        self.connected = False
+
+
+class SimNeoPixel:
+    """Byte buffer in GRB order like adafruit NeoPixel, which LED composites into directly."""
+
+    bpp = 3
+
+    def __init__(self, pin, n: int, auto_write: bool = True, brightness: float = 1.0, **kwargs):
+        self.pin = pin
+        self.n = n
+        self.auto_write = auto_write
+        self.shows = 0
+        self._byteorder = (1, 0, 2)
+        self._offset = 0
+        self._pre_brightness_buffer = None
+        self._post_brightness_buffer = bytearray(3 * n)
+        get_machine().strips.append(self)
+
+    def __len__(self) -> int:
+        return self.n
+
+    def __getitem__(self, index: int) -> tuple:
+        r, g, b = self._byteorder
+        data = self._post_brightness_buffer[3 * index:3 * index + 3]
+        return data[r], data[g], data[b]
+
+    def __setitem__(self, index: int, color: tuple):
+        for offset, value in zip(self._byteorder, color):
+            self._post_brightness_buffer[3 * index + offset] = int(value)
+
+    def show(self):
+        self.shows += 1
+
+
+class SimADS1115:
+    def __init__(self, address: int = 0x48, busnum: int = 1, noise: float = 3.0):
+        self.address = address
+        self.busnum = busnum
+        self.noise = noise
+        # Own generator: the noise only depends on when the ADC is read, so a replay sees the same samples
+        self._noise = random.Random(address)
+        self.continuous = False
+
+    def _convert(self) -> int:
+        station = get_machine().station_by_adc(self.address)
+        if station.adc_source is not None:
+            return station.adc_source()
+        balloon = station.balloon
+        voltage = 0.5 + 4.0 * balloon.pressure() / balloon.pressure_max
+        return int(voltage * 32767 / 4.096 + self._noise.gauss(0, self.noise))
+
+    def read_adc(self, channel: int, gain: int = 1, data_rate: int = None) -> int:
+        return self._convert()
+
+    def start_adc(self, channel: int, gain: int = 1, data_rate: int = None):
+        self.continuous = True
+
+    def get_last_result(self) -> int:
+        return self._convert()
+
+    def stop_adc(self):
+        self.continuous = False
+
+
+def topic_matches(subscription: str, topic: str) -> bool:
+    sub_parts = subscription.split("/")
+    topic_parts = topic.split("/")
+    for i, part in enumerate(sub_parts):
+        if part == "#":
+            return True
+        if i >= len(topic_parts) or (part != "+" and part != topic_parts[i]):
+            return False
+    return len(sub_parts) == len(topic_parts)
+
+
+class SimMessage:
+    def __init__(self, topic: str, payload: bytes):
+        self.topic = topic
+        self.payload = payload
+        self.qos = 0
+        self.retain = False
+        self.timestamp = time.monotonic()  # like paho: real receive time, the clock the tracer uses
+
+
+class SimBroker:
+    def __init__(self):
+        self.logger = logging.getLogger("SimBroker")
+        self.available = True
+        self.clients: list["SimMQTTClient"] = []
+        self.messages = 0
+
+    def set_available(self, available: bool):
+        """Simulates the broker going down or coming back, connected clients are dropped."""
+        self.available = available
+        if not available:
+            for client in list(self.clients):
+                if client.connected:
+                    client.connection_lost()
+
+    def publish(self, topic: str, payload):
+        if isinstance(payload, str):
+            payload = payload.encode()
+        self.messages += 1
+        for client in list(self.clients):
+            if client.connected and any(topic_matches(sub, topic) for sub in client.subscriptions):
+                client.deliver(SimMessage(topic, payload))
+
+
+class SimMQTTClient:
+    """In-process stand-in for paho.mqtt.client.Client, messages are delivered in the publishing thread."""
+
+    def __init__(self, *args, **kwargs):
+        self.broker = get_machine().broker
+        self.on_message = None
+        self.on_connect = None
+        self.on_disconnect = None
+        self.subscriptions: set[str] = set()
+        self.connected = False
+        self.min_delay = 1
+        self.max_delay = 120
+        self._address = None
+        self._running = False
+        self._wakeup = clock.Event()
+
+    def username_pw_set(self, username: str = None, password: str = None):
+        pass
+
+    def connect(self, host: str, port: int = 1883, keepalive: int = 60):
+        if not self.broker.available:
+            raise ConnectionRefusedError(f"Simulated broker {host}:{port} unavailable")
+        self.connected = True
+        if self not in self.broker.clients:
+            self.broker.clients.append(self)
+        if self.on_connect is not None:
+            self.on_connect(self, None, {}, 0)
+        return 0
+
+    def connect_async(self, host: str, port: int = 1883, keepalive: int = 60):
+        self._address = (host, port, keepalive)
+
+    def reconnect_delay_set(self, min_delay: int = 1, max_delay: int = 120):
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+
+    def disconnect(self):
+        self._running = False
+        self._wakeup.set()
+        self.connected = False
+        if self.on_disconnect is not None:
+            self.on_disconnect(self, None, 0)
+
+    def connection_lost(self):
+        self.connected = False
+        self.subscriptions.clear()  # clean session, like paho the owner has to resubscribe in on_connect
+        if self.on_disconnect is not None:
+            self.on_disconnect(self, None, 1)
+        self._wakeup.set()
+
+    def subscribe(self, topic: str, qos: int = 0):
+        self.subscriptions.add(topic)
+        return 0, 0
+
+    def unsubscribe(self, topic: str):
+        self.subscriptions.discard(topic)
+
+    def publish(self, topic: str, payload=None, qos: int = 0, retain: bool = False):
+        self.broker.publish(topic, payload if payload is not None else b"")
+
+    def deliver(self, msg: SimMessage):
+        if self.on_message is not None:
+            self.on_message(self, None, msg)
+
+    def loop_start(self):
+        """With connect_async, (re)connects in the background with exponential backoff like paho."""
+        if self._address is None or self._running:
+            return
+        self._running = True
+        clock.start_thread(self._reconnect_loop, "MQTT")
+
+    def loop_stop(self):
+        self._running = False
+        self._wakeup.set()
+
+    def _reconnect_loop(self):
+        delay = self.min_delay
+        while self._running:
+            if self.connected:
+                self._wakeup.wait()
+                self._wakeup.clear()
+                delay = self.min_delay
+                continue
+            try:
+                self.connect(*self._address)
+            except ConnectionRefusedError:
+                clock.sleep(delay)
+                delay = min(delay * 2, self.max_delay)
+
+
+class SimStation:
+    """Pins and balloon of one simulated station."""
+
+    def __init__(self, pump_io: int, valve_io: int, servo_io: int, adc_address: int):
+        self.pump_io = pump_io
+        self.valve_io = valve_io
+        self.servo_io = servo_io
+        self.adc_address = adc_address
+        self.balloon = BalloonModel()
+        self.ejects = 0
+        self.adc_source = None  # optional function returning raw ADC values, e.g. a recorded session
+
+
+class SimMachine:
+    def __init__(self):
+        self.broker = SimBroker()
+        self.pi = SimPi(self)
+        self.strips: list[SimNeoPixel] = []
+        self.ejects = 0
+        self.stations: list[SimStation] = []
+        self.by_pin: dict[int, SimStation] = {}
+        self.balloon = self.add_station(PUMP_IO, VALVE_IO, SERVO_IO, 0x48).balloon
+
+    def add_station(self, pump_io: int, valve_io: int, servo_io: int, adc_address: int) -> SimStation:
+        station = SimStation(pump_io, valve_io, servo_io, adc_address)
+        self.stations.append(station)
+        for io in (pump_io, valve_io, servo_io):
+            self.by_pin[io] = station
+        return station
+
+    def station_by_adc(self, address: int) -> SimStation:
+        for station in self.stations:
+            if station.adc_address == address:
+                return station
+        return self.stations[0]
+
+    @property
+    def strip_writes(self) -> int:
+        return sum(strip.shows for strip in self.strips)
+
+
+_machine = None
+
+
+def get_machine() -> SimMachine:
+    """The one simulated machine, created on first use so it picks up the active clock."""
+    global _machine
+    if _machine is None:
+        _machine = SimMachine()
+    return _machine
+
+
+def reset_machine() -> SimMachine:
+    global _machine
+    _machine = None
+    return get_machine()
+
+
+def resample(sensor, sps: int):
+    """Restarts the pressure sampling at sps, half a period out of phase with the game's timers.
+
+    On the virtual clock a sample and a fill check due at the same instant run
+    in whatever order the threads get scheduled, so a run and its replay could
+    average different windows.
+    """
+    sensor.stop_sampling()
+    sensor.sps = sps
+
+    def start():
+        clock.sleep(0.5 / sps)
+        sensor.start_sampling()
+
+    clock.start_thread(start, "SensorStart")
+
+
+def _tick_diff(t1: int, t2: int) -> int:
+    return (t2 - t1) & 0xFFFFFFFF
+
+
+# Stand-ins for the hardware libraries, see src/Backend.py
+board = types.SimpleNamespace(D10=10, D12=12, D13=13, D18=18, D19=19, D21=21)
+neopixel = types.SimpleNamespace(NeoPixel=SimNeoPixel)
+GPIO = types.SimpleNamespace(BCM=11, BOARD=10, setmode=lambda mode: None)
+pigpio = types.SimpleNamespace(pi=lambda *args: get_machine().pi, RISING_EDGE=0, FALLING_EDGE=1, EITHER_EDGE=2,
+                               tickDiff=_tick_diff)
+Adafruit_ADS1x15 = types.SimpleNamespace(ADS1115=SimADS1115)
+mqtt = types.SimpleNamespace(Client=SimMQTTClient, MQTTMessage=SimMessage)
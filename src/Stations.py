@@ -0,0 +1,93 @@
+import logging
+
+from src.Config import JsonConfig, config_path, read_json
+
+STATIONS_FILE = config_path("stations.json")
+
+# LED data pins the strip driver supports: GPIO number and the peripheral that clocks the data out
+LED_PINS = {"D18": (18, "PWM0"), "D12": (12, "PWM0"), "D13": (13, "PWM1"), "D19": (19, "PWM1"),
+            "D21": (21, "PCM"), "D10": (10, "SPI")}
+
+
+class StationConfig(JsonConfig):
+    """Pin map and MQTT topic prefix of one balloon station.
+
+    The defaults are the original single-station wiring, so a machine with one
+    balloon needs no stations.json. Further stations need their own pins, an
+    LED data pin on a peripheral no other strip uses (see LED_PINS), their own
+    ADS1115 address and a topic prefix such as "Station2/". led_process drives
+    the strip from its own process (see src/StripProcess.py), every strip but
+    one needs it.
+    """
+
+    def __init__(self, name: str = "Station1", pump_io: int = 17, valve_io: int = 27, servo_io: int = 13,
+                 led_pin: str = "D18", num_leds: int = 75, eject_button_io: int = 26, explode_button_io: int = 16,
+                 mode_button_io: int = 22, status_io: int = 6, sensor_bus: int = 1, sensor_address: int = 0x48,
+                 topic_prefix: str = "", players: tuple = (1, 2, 3, 4), balloon: str = "default",
+                 led_process: bool = False):
+        self.name = name
+        self.pump_io = pump_io
+        self.valve_io = valve_io
+        self.servo_io = servo_io
+        self.led_pin = led_pin
+        self.num_leds = num_leds
+        self.eject_button_io = eject_button_io
+        self.explode_button_io = explode_button_io
+        self.mode_button_io = mode_button_io
+        self.status_io = status_io
+        self.sensor_bus = sensor_bus
+        self.sensor_address = sensor_address
+        self.topic_prefix = topic_prefix
+        self.players = tuple(players)
+        self.balloon = balloon  # name of the calibration profile
+        self.led_process = led_process
+
+    def pins(self) -> list[int]:
+        return [self.pump_io, self.valve_io, self.servo_io, self.eject_button_io, self.explode_button_io,
+                self.mode_button_io, self.status_io]
+
+    def __repr__(self):
+        return f"StationConfig({self.name!r}, prefix={self.topic_prefix!r})"
+
+
+def check_stations(stations: list[StationConfig]):
+    """Raises ValueError if two stations share a GPIO, an LED peripheral, an ADC or a topic prefix.
+
+    Also if more than one strip would be driven from the game process, the strip
+    driver only handles one per process.
+    """
+    seen = {}
+    in_process = []
+    for station in stations:
+        if station.led_pin not in LED_PINS:
+            raise ValueError(f"{station.name}: LED pin {station.led_pin} is not one of {', '.join(LED_PINS)}")
+        led_io, channel = LED_PINS[station.led_pin]
+        keys = [("GPIO", io) for io in station.pins() + [led_io]]
+        keys += [("LED channel", channel), ("ADS1115", (station.sensor_bus, station.sensor_address)),
+                 ("topic prefix", station.topic_prefix), ("name", station.name)]
+        for key in keys:
+            if key in seen:
+                other = "itself" if seen[key] == station.name else seen[key]
+                raise ValueError(f"{station.name} and {other} both use {key[0]} {key[1]}")
+            seen[key] = station.name
+        if not station.led_process:
+            in_process.append(station.name)
+    if len(in_process) > 1:
+        raise ValueError(f"{' and '.join(in_process)} would both drive their strip from the game process, "
+                         f"set led_process for all but one")
+
+
+def load_stations(path: str = STATIONS_FILE, led_process: bool = False) -> list[StationConfig]:
+    """The stations from stations.json, the single default station if there is none.
+
+    led_process moves every strip into its own process, like --led-process.
+    """
+    data = read_json(path, logging.getLogger("Stations"))
+    if data is None:
+        return [StationConfig(led_process=led_process)]
+    stations = [StationConfig.from_dict(entry) for entry in data]
+    if led_process:
+        for station in stations:
+            station.led_process = True
+    check_stations(stations)
+    return stations
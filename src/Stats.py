@@ -0,0 +1,330 @@
+import atexit
+import logging
+import os
+import queue
+import sqlite3
+import time
+
+from src.Clock import clock
+
+# Outside the checkout, the database and its -wal/-shm files change with every round
+STATS_FILE = os.path.join(os.path.expanduser("~"), ".local", "share", "ballongame", "stats.db")
+
+SCHEMA_VERSION = 1
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY,
+    started REAL NOT NULL,
+    ended REAL
+);
+CREATE TABLE IF NOT EXISTS rounds (
+    id INTEGER PRIMARY KEY,
+    session INTEGER NOT NULL,
+    station TEXT NOT NULL,
+    mode TEXT NOT NULL,
+    day TEXT NOT NULL,
+    started REAL NOT NULL,
+    duration REAL NOT NULL,
+    outcome TEXT NOT NULL,
+    pulses INTEGER NOT NULL,
+    presses INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS rounds_by_day ON rounds (day, mode);
+CREATE TABLE IF NOT EXISTS presses (
+    round INTEGER NOT NULL,
+    player INTEGER NOT NULL,
+    time REAL NOT NULL,
+    reaction REAL
+);
+CREATE INDEX IF NOT EXISTS presses_by_round ON presses (round);
+CREATE TABLE IF NOT EXISTS daily_modes (
+    day TEXT NOT NULL,
+    station TEXT NOT NULL,
+    mode TEXT NOT NULL,
+    rounds INTEGER NOT NULL DEFAULT 0,
+    won INTEGER NOT NULL DEFAULT 0,
+    fill_seconds REAL NOT NULL DEFAULT 0,
+    pulses INTEGER NOT NULL DEFAULT 0,
+    presses INTEGER NOT NULL DEFAULT 0,
+    reactions INTEGER NOT NULL DEFAULT 0,
+    reaction_seconds REAL NOT NULL DEFAULT 0,
+    reaction_best REAL,
+    PRIMARY KEY (day, station, mode)
+);
+CREATE TABLE IF NOT EXISTS daily_players (
+    day TEXT NOT NULL,
+    station TEXT NOT NULL,
+    mode TEXT NOT NULL,
+    player INTEGER NOT NULL,
+    presses INTEGER NOT NULL DEFAULT 0,
+    reactions INTEGER NOT NULL DEFAULT 0,
+    reaction_seconds REAL NOT NULL DEFAULT 0,
+    reaction_best REAL,
+    PRIMARY KEY (day, station, mode, player)
+);
+"""
+
+UPSERT_MODE = """
+INSERT INTO daily_modes (day, station, mode, rounds, won, fill_seconds, pulses, presses, reactions,
+                         reaction_seconds, reaction_best)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (day, station, mode) DO UPDATE SET
+    rounds = rounds + excluded.rounds,
+    won = won + excluded.won,
+    fill_seconds = fill_seconds + excluded.fill_seconds,
+    pulses = pulses + excluded.pulses,
+    presses = presses + excluded.presses,
+    reactions = reactions + excluded.reactions,
+    reaction_seconds = reaction_seconds + excluded.reaction_seconds,
+    reaction_best = COALESCE(MIN(reaction_best, excluded.reaction_best), reaction_best, excluded.reaction_best)
+"""
+
+UPSERT_PLAYER = """
+INSERT INTO daily_players (day, station, mode, player, presses, reactions, reaction_seconds, reaction_best)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (day, station, mode, player) DO UPDATE SET
+    presses = presses + excluded.presses,
+    reactions = reactions + excluded.reactions,
+    reaction_seconds = reaction_seconds + excluded.reaction_seconds,
+    reaction_best = COALESCE(MIN(reaction_best, excluded.reaction_best), reaction_best, excluded.reaction_best)
+"""
+
+_STOP = ("stop",)
+
+
+def day_of(timestamp: float) -> str:
+    return time.strftime("%Y-%m-%d", time.localtime(timestamp))
+
+
+class Round:
+    """Counters of one balloon, written to the store when it ends."""
+
+    __slots__ = ("id", "station", "mode", "started", "start_monotonic", "pulses", "presses")
+
+    def __init__(self, id: int, station: str, mode: str):
+        self.id = id
+        self.station = station
+        self.mode = mode
+        self.started = clock.time()
+        self.start_monotonic = clock.monotonic()
+        self.pulses = 0
+        self.presses = 0
+
+
+class _Aggregate:
+    # Sums of one daily_modes / daily_players row within a batch
+    __slots__ = ("rounds", "won", "fill_seconds", "pulses", "presses", "reactions", "reaction_seconds",
+                 "reaction_best")
+
+    def __init__(self):
+        self.rounds = self.won = self.pulses = self.presses = self.reactions = 0
+        self.fill_seconds = self.reaction_seconds = 0.0
+        self.reaction_best = None
+
+    def react(self, reaction: float):
+        self.reactions += 1
+        self.reaction_seconds += reaction
+        if self.reaction_best is None or reaction < self.reaction_best:
+            self.reaction_best = reaction
+
+
+class StatsStore:
+    """Persistent game statistics in SQLite (WAL mode).
+
+    The game only appends to a queue. A writer thread collects up to batch_size
+    entries or flush_interval seconds worth and commits them in one
+    transaction, updating the per-day aggregate tables in the same go, so the
+    summaries never have to scan the raw rounds and presses.
+    """
+
+    def __init__(self):
+        self.logger = logging.getLogger("Stats")
+        self.active = False
+        self.path = None
+        self.session = None
+        self.batch_size = 256
+        self.flush_interval = 1.0
+        self._queue = None
+        self._writer = None
+        self._next_round = 0
+        self._open: dict[int, Round] = {}  # started rounds without a rounds row yet
+
+    def open(self, path: str = STATS_FILE, batch_size: int = 256, flush_interval: float = 1.0):
+        self.close()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        db = connect(path)
+        try:
+            with db:
+                db.executescript(SCHEMA)
+                db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            self.session = db.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM sessions").fetchone()[0]
+            # Presses of a round that never got its rounds row (older versions, a crash) still claim its id
+            self._next_round = db.execute("SELECT MAX((SELECT COALESCE(MAX(id), 0) FROM rounds), "
+                                          "(SELECT COALESCE(MAX(round), 0) FROM presses)) + 1").fetchone()[0]
+        finally:
+            db.close()
+
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = clock.Queue()
+        self._writer = clock.start_thread(self._write_loop, "StatsWriter")
+        self.active = True
+        self._queue.put(("session", self.session, clock.time()))
+        atexit.register(self.close)  # unregistered again in close()
+        self.logger.info(f"Writing statistics to {path} (session {self.session})")
+
+    def start_round(self, station: str, mode: str) -> Round:
+        if not self.active:
+            return None
+        game_round = Round(self._next_round, station, mode)
+        self._next_round += 1
+        self._open[game_round.id] = game_round
+        return game_round
+
+    def press(self, game_round: Round, player: int, reaction: float = None):
+        if game_round is None or not self.active:
+            return
+        game_round.presses += 1
+        self._queue.put(("press", game_round, player, clock.time(), reaction))
+
+    def end_round(self, game_round: Round, outcome: str):
+        """outcome is "won" (ejected) or "aborted" (mode switched, game stopped)."""
+        if game_round is None or not self.active or self._open.pop(game_round.id, None) is None:
+            return
+        self._queue.put(("round", game_round, outcome, clock.monotonic() - game_round.start_monotonic))
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Waits until everything queued so far is committed."""
+        if not self.active:
+            return True
+        done = clock.Event()
+        self._queue.put(("flush", done))
+        return done.wait(timeout)
+
+    def close(self):
+        if not self.active:
+            return
+        atexit.unregister(self.close)
+        for game_round in list(self._open.values()):
+            self.end_round(game_round, "aborted")  # still running at shutdown
+        self.active = False
+        self._queue.put(("session_end", self.session, clock.time()))
+        self._queue.put(_STOP)
+        clock.join(self._writer, 10.0)
+
+    def _write_loop(self):
+        db = connect(self.path)
+        running = True
+        while running:
+            batch = [self._queue.get()]
+            deadline = clock.monotonic() + self.flush_interval
+            while batch[-1][0] not in ("stop", "flush") and len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get(timeout=max(0.0, deadline - clock.monotonic())))
+                except queue.Empty:
+                    break
+            try:
+                self._write(db, batch)
+            except sqlite3.Error:
+                self.logger.exception(f"Dropped {len(batch)} statistics entries")
+            for entry in batch:
+                if entry[0] == "flush":
+                    entry[1].set()
+                elif entry[0] == "stop":
+                    running = False
+        db.close()
+
+    def _write(self, db: sqlite3.Connection, batch: list):
+        modes: dict[tuple, _Aggregate] = {}
+        players: dict[tuple, _Aggregate] = {}
+        press_rows = []
+        with db:
+            for entry in batch:
+                kind = entry[0]
+                if kind == "press":
+                    _, game_round, player, timestamp, reaction = entry
+                    press_rows.append((game_round.id, player, timestamp, reaction))
+                    key = (day_of(timestamp), game_round.station, game_round.mode)
+                    aggregate = players.setdefault(key + (player,), _Aggregate())
+                    aggregate.presses += 1
+                    if reaction is not None:
+                        aggregate.react(reaction)
+                        modes.setdefault(key, _Aggregate()).react(reaction)
+                elif kind == "round":
+                    _, game_round, outcome, duration = entry
+                    day = day_of(game_round.started)
+                    db.execute("INSERT INTO rounds VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                               (game_round.id, self.session, game_round.station, game_round.mode, day, game_round.started, duration,
+                                outcome, game_round.pulses, game_round.presses))
+                    aggregate = modes.setdefault((day, game_round.station, game_round.mode), _Aggregate())
+                    aggregate.rounds += 1
+                    aggregate.pulses += game_round.pulses
+                    aggregate.presses += game_round.presses
+                    if outcome == "won":
+                        aggregate.won += 1
+                        aggregate.fill_seconds += duration
+                elif kind == "session":
+                    db.execute("INSERT INTO sessions (id, started) VALUES (?, ?)", entry[1:])
+                elif kind == "session_end":
+                    db.execute("UPDATE sessions SET ended = ? WHERE id = ?", (entry[2], entry[1]))
+            db.executemany("INSERT INTO presses VALUES (?, ?, ?, ?)", press_rows)
+            db.executemany(UPSERT_MODE, [key + (a.rounds, a.won, a.fill_seconds, a.pulses, a.presses, a.reactions,
+                                                a.reaction_seconds, a.reaction_best) for key, a in modes.items()])
+            db.executemany(UPSERT_PLAYER, [key + (a.presses, a.reactions, a.reaction_seconds, a.reaction_best)
+                                           for key, a in players.items()])
+
+
+def connect(path: str = STATS_FILE) -> sqlite3.Connection:
+    db = sqlite3.connect(path, timeout=10.0, check_same_thread=False)
+    db.row_factory = sqlite3.Row
+    db.execute("PRAGMA journal_mode = WAL")
+    db.execute("PRAGMA synchronous = NORMAL")  # WAL stays consistent, at most the last commits are lost on power loss
+    return db
+
+
+def _since(days: int) -> str:
+    return day_of(clock.time() - days * 86400)
+
+
+def _query(path: str, sql: str, params: tuple = ()) -> list[dict]:
+    db = sqlite3.connect(f"file:{path}?mode=ro", uri=True, timeout=10.0)
+    db.row_factory = sqlite3.Row
+    try:
+        return [dict(row) for row in db.execute(sql, params)]
+    finally:
+        db.close()
+
+
+def daily_summary(days: int = 30, path: str = STATS_FILE) -> list[dict]:
+    """Rounds, wins, mean fill time and reaction times per day and mode."""
+    return _query(path, """
+        SELECT day, mode, SUM(rounds) AS rounds, SUM(won) AS won,
+               SUM(fill_seconds) / NULLIF(SUM(won), 0) AS mean_fill_seconds, SUM(presses) AS presses,
+               SUM(pulses) AS pulses, SUM(reaction_seconds) / NULLIF(SUM(reactions), 0) AS mean_reaction,
+               MIN(reaction_best) AS best_reaction
+        FROM daily_modes WHERE day >= ? GROUP BY day, mode ORDER BY day, mode""", (_since(days),))
+
+
+def mode_summary(path: str = STATS_FILE) -> list[dict]:
+    """The same totals per mode over all days."""
+    return _query(path, """
+        SELECT mode, COUNT(DISTINCT day) AS days, SUM(rounds) AS rounds, SUM(won) AS won,
+               SUM(fill_seconds) / NULLIF(SUM(won), 0) AS mean_fill_seconds, SUM(presses) AS presses,
+               SUM(pulses) AS pulses, SUM(reaction_seconds) / NULLIF(SUM(reactions), 0) AS mean_reaction,
+               MIN(reaction_best) AS best_reaction
+        FROM daily_modes GROUP BY mode ORDER BY mode""")
+
+
+def player_summary(days: int = 30, path: str = STATS_FILE) -> list[dict]:
+    """Presses and reaction times per player and mode."""
+    return _query(path, """
+        SELECT mode, player, SUM(presses) AS presses, SUM(reactions) AS reactions,
+               SUM(reaction_seconds) / NULLIF(SUM(reactions), 0) AS mean_reaction,
+               MIN(reaction_best) AS best_reaction
+        FROM daily_players WHERE day >= ? GROUP BY mode, player ORDER BY mode, player""", (_since(days),))
+
+
+stats = StatsStore()
@@ -0,0 +1,137 @@
+import atexit
+import logging
+import multiprocessing
+import signal
+import struct
+import time
+from multiprocessing import shared_memory
+
+# Shared memory layout: header, then the frame in the strip's byte order
+HEADER = struct.Struct("<QQ")  # frame sequence (odd while the game writes), frames shown by the render process
+SEQUENCE = struct.Struct("<Q")
+SHOWN_OFFSET = 8
+
+
+class StripProcess:
+    """Owns the neopixel strip in a separate process, fed with frames through shared memory.
+
+    The NeoPixel transmission holds the GIL for the whole frame, which stalls the
+    MQTT thread, the button threads and the game loop. Here the game process only
+    copies the finished frame into shared memory between two increments of the
+    frame sequence (odd while copying, like a seqlock) and releases a semaphore,
+    which unlike multiprocessing.Event never waits for the other side. The
+    render process copies a frame out, rereads the sequence to drop torn copies,
+    transmits it and counts it in the header. Frames the render process misses
+    are superseded by the next one, the strip always gets the newest.
+    """
+
+    def __init__(self, pin, num_leds: int, name: str = "LEDStrip", timeout: float = 10.0):
+        self.logger = logging.getLogger("StripProcess")
+        self.num_leds = num_leds
+        self.sequence = 0
+        self._alive = True
+        self._shm = shared_memory.SharedMemory(create=True, size=HEADER.size + 3 * num_leds)
+        self._shm.buf[:HEADER.size] = HEADER.pack(0, 0)
+        self.frame = self._shm.buf[HEADER.size:]
+
+        # spawn, not fork: the game process already runs paho, pigpio and button threads
+        context = multiprocessing.get_context("spawn")
+        self._wake = context.Semaphore(0)
+        self._stop = context.Event()
+        receiver, sender = context.Pipe(duplex=False)
+        self.process = context.Process(target=_render_main, name=name, daemon=True,
+                                       args=(self._shm.name, pin, num_leds, self._wake, self._stop, sender))
+        self.process.start()
+        sender.close()
+        atexit.register(self.close)
+        try:
+            if not receiver.poll(timeout):
+                raise RuntimeError(f"{name} did not start within {timeout:.0f} s")
+            self.order = receiver.recv()  # (r, g, b) byte offsets of the strip
+        except EOFError:
+            self.close()
+            raise RuntimeError(f"{name} exited while starting, code {self.process.exitcode}") from None
+        except RuntimeError:
+            self.close()
+            raise
+        finally:
+            receiver.close()
+        self.logger.info(f"{name} renders {num_leds} LEDs in process {self.process.pid}")
+
+    @property
+    def shown(self) -> int:
+        """Frames the render process has transmitted."""
+        return SEQUENCE.unpack_from(self._shm.buf, SHOWN_OFFSET)[0]
+
+    def publish(self, frame: bytearray):
+        """Hands a complete frame to the render process, never waits for the strip."""
+        if not self.process.is_alive():
+            if self._alive:
+                self._alive = False
+                self.logger.error(f"{self.process.name} exited with code {self.process.exitcode}, LEDs stay as they are")
+            return
+        buf = self._shm.buf
+        SEQUENCE.pack_into(buf, 0, self.sequence + 1)
+        self.frame[:] = frame
+        self.sequence += 2
+        SEQUENCE.pack_into(buf, 0, self.sequence)
+        self._wake.release()
+
+    def close(self):
+        if self._shm is None:
+            return
+        try:
+            self._stop.set()
+            self._wake.release()
+            if self.process.pid is not None:
+                self.process.join(2.0)
+                if self.process.is_alive():
+                    self.process.terminate()
+        finally:
+            self.frame.release()
+            self._shm.close()
+            self._shm.unlink()
+            self._shm = None
+
+
+def _render_main(shm_name: str, pin, num_leds: int, wake, stop, ready):
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl+C reaches the whole group, the game process stops us
+    from src.Backend import neopixel
+    from src.Hardware import strip_buffer
+
+    shm = shared_memory.SharedMemory(name=shm_name)  # spawned children share the game's resource tracker
+    buf = shm.buf
+    frame = buf[HEADER.size:]
+    pixels = neopixel.NeoPixel(pin, num_leds, auto_write=False)
+    out, order = strip_buffer(pixels)
+    ready.send(order)
+    ready.close()
+
+    shown_sequence = 0
+    shown = 0
+    try:
+        while not stop.is_set():
+            if not wake.acquire(timeout=0.5):
+                continue
+            while wake.acquire(False):
+                pass  # one frame covers every wakeup so far
+            sequence = SEQUENCE.unpack_from(buf, 0)[0]
+            while sequence != shown_sequence:
+                if sequence & 1:
+                    time.sleep(0.0002)  # the game is copying a frame right now
+                elif out is not None:
+                    out[:] = frame
+                else:
+                    for led in range(num_leds):
+                        pixels[led] = (frame[3 * led], frame[3 * led + 1], frame[3 * led + 2])
+                latest = SEQUENCE.unpack_from(buf, 0)[0]
+                if sequence & 1 or latest != sequence:
+                    sequence = latest  # torn copy, take the newer frame
+                    continue
+                pixels.show()
+                shown_sequence = sequence
+                shown += 1
+                SEQUENCE.pack_into(buf, SHOWN_OFFSET, shown)
+    finally:
+        del frame, buf
+        shm.close()
@@ -0,0 +1,155 @@
+import itertools
+import json
+import logging
+import os
+import time
+
+# Stages of one press, in the order they normally happen
+PUBLISH = 0   # Pico sent it (only if the payload carries a timestamp, e.g. from Spam_messages.py)
+RECEIVE = 1   # paho read it from the socket (MQTTMessage.timestamp)
+CALLBACK = 2  # our MQTT callback started
+DECODE = 3    # recognised as a new press
+STATE = 4     # press stored in the InputState
+PICKUP = 5    # game loop drained it
+ACTUATOR = 6  # pump or valve command issued while handling it
+LED = 7       # first strip frame showing a change made while handling it
+
+STAGE_NAMES = ("publish", "receive", "callback", "decode", "state update", "loop pickup", "actuator command",
+               "led confirm")
+
+# Span names in the Chrome trace, each span ends at its stage
+SPAN_NAMES = ("", "broker", "paho dispatch", "decode", "state update", "loop pickup", "game logic", "led frame")
+
+
+class Tracer:
+    """Per-press latency tracing into a fixed in-memory ring.
+
+    Every press gets a trace id, every stage appends (trace, stage, time,
+    player) to the ring. Slots come from an itertools.count, whose next() is
+    atomic in CPython, so writers from the paho, game loop and LED threads never
+    take a lock; the oldest entries are overwritten. Times are time.monotonic(),
+    the clock paho stamps received messages with.
+    """
+
+    def __init__(self, size: int = 65536):
+        self.logger = logging.getLogger("Tracer")
+        self.enabled = False
+        self.current: tuple[int, ...] = ()  # traces the game loop is handling right now
+        self._size = size
+        self._slots = [None] * size
+        self._index = itertools.count()
+        self._ids = itertools.count(1)
+        self._message = None
+
+    def enable(self, size: int = None):
+        if size is not None and size != self._size:
+            self._size = size
+            self._slots = [None] * size
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+        self.current = ()
+
+    def clear(self):
+        self._slots = [None] * self._size
+
+    def _add(self, trace: int, stage: int, timestamp: float, player: int = 0):
+        self._slots[next(self._index) % self._size] = (trace, stage, timestamp, player)
+
+    def message(self, msg):
+        """Called by the MQTT callback, before the pipeline decides whether msg is a press."""
+        self._message = (msg, time.monotonic())
+
+    def begin(self, player: int) -> int:
+        """New trace for a press of player, with the stages of the message that carried it."""
+        trace = next(self._ids)
+        now = time.monotonic()
+        message = self._message
+        if message is not None:
+            msg, callback_time = message
+            received = getattr(msg, "timestamp", None)
+            if received:
+                self._add(trace, RECEIVE, received, player)
+            sent = _sent_time(msg.payload, now)
+            if sent is not None:
+                self._add(trace, PUBLISH, sent, player)
+            self._add(trace, CALLBACK, callback_time, player)
+        self._add(trace, DECODE, now, player)
+        return trace
+
+    def mark(self, trace: int, stage: int, player: int = 0):
+        self._add(trace, stage, time.monotonic(), player)
+
+    def mark_current(self, stage: int):
+        if self.current:
+            now = time.monotonic()
+            for trace in self.current:
+                self._add(trace, stage, now)
+
+    def mark_all(self, traces: list[int], stage: int):
+        now = time.monotonic()
+        for trace in traces:
+            self._add(trace, stage, now)
+
+    def traces(self) -> dict[int, dict]:
+        """{trace: {"player": p, "stages": {stage: time}}}, the first time of every stage counts."""
+        traces = {}
+        for entry in list(self._slots):
+            if entry is None:
+                continue
+            trace, stage, timestamp, player = entry
+            info = traces.setdefault(trace, {"player": 0, "stages": {}})
+            if player:
+                info["player"] = player
+            if stage not in info["stages"] or timestamp < info["stages"][stage]:
+                info["stages"][stage] = timestamp
+        return traces
+
+    def chrome_trace(self) -> dict:
+        """Trace-event JSON for chrome://tracing or Perfetto, one lane per player."""
+        events = [{"name": "process_name", "ph": "M", "pid": 1, "args": {"name": "Ballongame inputs"}}]
+        for trace, info in sorted(self.traces().items()):
+            stages = sorted(info["stages"].items(), key=lambda item: item[1])
+            if not stages:
+                continue
+            tid = info["player"]
+            first, last = stages[0][1], stages[-1][1]
+            args = {"trace": trace, "player": tid}
+            events.append({"name": f"press {trace}", "cat": "input", "ph": "X", "pid": 1, "tid": tid,
+                           "ts": first * 1e6, "dur": (last - first) * 1e6, "args": args})
+            for (_, start), (stage, end) in zip(stages, stages[1:]):
+                events.append({"name": SPAN_NAMES[stage], "cat": "stage", "ph": "X", "pid": 1, "tid": tid,
+                               "ts": start * 1e6, "dur": (end - start) * 1e6, "args": args})
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def dump(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "w") as file:
+            json.dump(self.chrome_trace(), file)
+        self.logger.info(f"Wrote input traces to {path}")
+
+    def stage_latencies(self) -> dict[str, list[float]]:
+        """Seconds spent in every span, over all traces in the ring."""
+        spans = {}
+        for info in self.traces().values():
+            stages = sorted(info["stages"].items(), key=lambda item: item[1])
+            for (_, start), (stage, end) in zip(stages, stages[1:]):
+                spans.setdefault(SPAN_NAMES[stage], []).append(end - start)
+        return spans
+
+
+def _sent_time(payload: bytes, now: float):
+    # Load-test payloads are "<state> <time.time()>", mapped onto the monotonic clock
+    if not payload or len(payload) < 3 or payload[1:2] != b" ":
+        return None
+    try:
+        sent = float(payload[2:])
+    except ValueError:
+        return None
+    return now - (time.time() - sent)
+
+
+tracer = Tracer()
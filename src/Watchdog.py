@@ -0,0 +1,179 @@
+import itertools
+import logging
+import sys
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+
+from src.Metrics import metrics
+
+# Fraction of its deadline above which a finished call counts as a near miss
+NEAR_MISS = 0.5
+
+WATCHDOG_OVERRUNS = metrics.counter("ballongame_watchdog_overruns_total", "Watched calls that ran past their deadline",
+                                    ("call",))
+WATCHDOG_NEAR_MISSES = metrics.counter("ballongame_watchdog_near_misses_total",
+                                       "Watched calls that finished in time but used most of their deadline", ("call",))
+WATCHDOG_BUDGET = metrics.histogram("ballongame_watchdog_budget_ratio", "Duration of a watched call / its deadline",
+                                    ("call",), buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 0.75, 0.9, 1.0, 2.0, 5.0))
+
+
+class _Watch:
+    __slots__ = ("name", "thread", "start", "deadline", "safe", "reported")
+
+    def __init__(self, name: str, thread: threading.Thread, start: float, deadline: float, safe: bool):
+        self.name = name
+        self.thread = thread
+        self.start = start
+        self.deadline = deadline
+        self.safe = safe
+        self.reported = False
+
+
+class Watchdog:
+    """Deadlines for game loop iterations and hardware calls, checked by a monitor thread.
+
+    arm() registers a deadline and returns a token for disarm(); watch() does
+    both around a with block. The monitor thread looks at the open deadlines
+    every interval; for every call past its deadline it logs the call, dumps
+    the stacks of all threads with the calls they are in, and for safe watches
+    runs the safe-state callbacks (pump off, valve open). Finished calls feed
+    how much of their deadline they used into a histogram per call, so the
+    worst loop times actually hit show up in the metrics before they become
+    overruns. Times are real time.monotonic() even in the simulation, a stall
+    has to be seen while the virtual clock is stuck with it.
+    """
+
+    def __init__(self, interval: float = 0.05):
+        self.logger = logging.getLogger("Watchdog")
+        self.enabled = False
+        self.interval = interval
+        self.overruns = 0
+        self.worst: dict[str, float] = {}  # longest duration per call, in seconds
+        self._watches: dict[int, _Watch] = {}
+        self._ids = itertools.count(1)
+        self._metrics = {}
+        self._safe_states = []
+        self._stop = threading.Event()
+        self._thread = None
+
+    def add_safe_state(self, callback):
+        """callback() drives actuators to a safe state; it runs without the actuator locks, which may be stuck."""
+        self._safe_states.append(callback)
+
+    def start(self, interval: float = None):
+        if self.enabled:
+            return
+        if interval is not None:
+            self.interval = interval
+        self._stop.clear()
+        self.enabled = True
+        # A plain thread on purpose: it has to run while the watched threads (and the virtual clock) are stuck
+        self._thread = threading.Thread(target=self._monitor_loop, name="Watchdog", daemon=True)
+        self._thread.start()
+        self.logger.info(f"Watching deadlines every {self.interval * 1000:.0f} ms")
+
+    def stop(self):
+        self.enabled = False
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self._watches.clear()
+
+    def arm(self, name: str, seconds: float, safe: bool = True) -> int:
+        """Starts a deadline of seconds for the calling thread, 0 while the watchdog is stopped."""
+        if not self.enabled:
+            return 0
+        token = next(self._ids)
+        start = time.monotonic()
+        self._watches[token] = _Watch(name, threading.current_thread(), start, start + seconds, safe)
+        return token
+
+    def disarm(self, token: int):
+        if not token:
+            return
+        end = time.monotonic()
+        watch = self._watches.pop(token, None)
+        if watch is None:
+            return
+        elapsed = end - watch.start
+        ratio = elapsed / (watch.deadline - watch.start)
+        budget, near_misses = self._metrics_for(watch.name)
+        budget.observe(ratio)
+        if elapsed > self.worst.get(watch.name, 0.0):
+            self.worst[watch.name] = elapsed
+        if watch.reported:
+            self.logger.warning(f"{watch.name} finished after {elapsed:.3f} s, "
+                                f"deadline was {watch.deadline - watch.start:.3f} s")
+        elif ratio >= NEAR_MISS:
+            near_misses.inc()
+
+    @contextmanager
+    def watch(self, name: str, seconds: float, safe: bool = True):
+        token = self.arm(name, seconds, safe)
+        try:
+            yield
+        finally:
+            self.disarm(token)
+
+    def _metrics_for(self, name: str) -> tuple:
+        children = self._metrics.get(name)
+        if children is None:
+            children = self._metrics[name] = (WATCHDOG_BUDGET.labels(name), WATCHDOG_NEAR_MISSES.labels(name))
+        return children
+
+    def _monitor_loop(self):
+        while not self._stop.wait(self.interval):
+            now = time.monotonic()
+            for watch in list(self._watches.values()):
+                if not watch.reported and now > watch.deadline:
+                    watch.reported = True
+                    self._overrun(watch, now)
+
+    def _overrun(self, watch: _Watch, now: float):
+        self.overruns += 1
+        WATCHDOG_OVERRUNS.labels(watch.name).inc()
+        self.logger.error(f"{watch.name} on {watch.thread.name} has run {now - watch.start:.3f} s, "
+                          f"deadline {watch.deadline - watch.start:.3f} s\n{self.dump_stacks(now)}")
+        if watch.safe and self._safe_states:
+            # Own thread, so the monitor keeps checking even if the safe state blocks as well
+            threading.Thread(target=self.safe_state, args=(watch.name,), name="WatchdogSafeState",
+                             daemon=True).start()
+
+    def safe_state(self, reason: str = "manual"):
+        self.logger.warning(f"Driving actuators to the safe state ({reason})")
+        for callback in self._safe_states:
+            try:
+                callback()
+            except Exception:
+                self.logger.exception("Safe state callback failed")
+
+    def dump_stacks(self, now: float = None) -> str:
+        """Stacks of all threads, each headed by the watched calls it is in and for how long."""
+        if now is None:
+            now = time.monotonic()
+        watching = {}
+        for watch in list(self._watches.values()):
+            watching.setdefault(watch.thread.ident, []).append(watch)
+        threads = {thread.ident: thread for thread in threading.enumerate()}
+        lines = []
+        frames = sys._current_frames()
+        frames.pop(threading.get_ident(), None)
+        for ident, frame in sorted(frames.items(), key=lambda item: item[0] not in watching):  # watched threads first
+            thread = threads.get(ident)
+            lines.append(f"Thread {thread.name if thread else '?'} ({ident}):")
+            for watch in watching.get(ident, []):
+                state = "OVERRUN" if now > watch.deadline else "in time"
+                lines.append(f"  in {watch.name} for {now - watch.start:.3f} s of {watch.deadline - watch.start:.3f} s"
+                             f" ({state})")
+            lines.extend("  " + line.rstrip("\n").replace("\n", "\n  ") for line in traceback.format_stack(frame))
+        return "\n".join(lines)
+
+    def summary(self) -> dict[str, float]:
+        """Longest duration seen per watched call, in seconds."""
+        return dict(self.worst)
+
+
+watchdog = Watchdog()
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# The tests run without the Pi's hardware libraries
+os.environ.setdefault("BALLONGAME_BACKEND", "sim")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,77 @@
+from src.Inputs import InputPipeline, InputState, PRESSED, input_topics
+
+
+class FakeEvents:
+    def __init__(self):
+        self.posted = []
+
+    def post(self, kind, data=None):
+        self.posted.append(kind)
+
+
+def test_press_is_visible_until_cleared():
+    state = InputState()
+    state.press(2)
+    assert state[2] and not state[1]
+    assert state.count() == 1
+    state.clear()
+    assert not state[2]
+    assert state.count() == 0
+
+
+def test_press_after_clear_counts():
+    state = InputState()
+    state.press(1)
+    state.clear()
+    state.press(1)
+    state.press(3)
+    assert state.count() == 2
+    assert [player for player in state if state[player]] == [1, 3]
+
+
+def test_clear_up_to_tick_keeps_later_presses():
+    state = InputState()
+    state.press(4)
+    state.press(1)
+    tick = state.tick()
+    state.press(2)  # arrives between the count and the clear
+    assert state.count(tick) == 2
+    state.clear(tick)
+    assert state.count() == 1
+    assert state[2] and not state[1] and not state[4]
+
+
+def test_pressed_since_uses_sequence_numbers():
+    state = InputState()
+    state.press(1)
+    tick = state.tick()
+    state.press(2)
+    state.press(1)
+    assert state.pressed_since(tick) == [1, 2]
+    assert state.pressed_since(state.tick()) == []
+
+
+def test_station_players():
+    state = InputState((5, 6))
+    state.press(6)
+    assert list(state) == [5, 6]
+    assert state.count() == 1
+    assert repr(state) == "{5: False, 6: True}"
+
+
+def test_pipeline_counts_edges_and_posts_once_per_drain():
+    events = FakeEvents()
+    state = InputState()
+    pipeline = InputPipeline(events, state, input_topics())
+    assert pipeline.on_message("Pico1/Eingabe", PRESSED) == 1
+    assert pipeline.on_message("Pico1/Eingabe", PRESSED) is None  # still held, no new edge
+    assert pipeline.on_message("Pico3/Eingabe", PRESSED + b" 123.4") == 3
+    assert pipeline.on_message("Other/Eingabe", PRESSED) is None
+    assert len(events.posted) == 1
+    assert pipeline.drain() == [1, 3]
+    assert pipeline.drain() == []
+
+    pipeline.on_message("Pico1/Eingabe", b"1")
+    assert pipeline.on_message("Pico1/Eingabe", PRESSED) == 1
+    assert len(events.posted) == 2
+    assert pipeline.drain() == [1]
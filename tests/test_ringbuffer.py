@@ -0,0 +1,70 @@
+import statistics
+
+import pytest
+
+from src.Hardware import RingBuffer
+
+
+def fill(values, size):
+    ring = RingBuffer(size)
+    for value in values:
+        ring.push(value)
+    return ring
+
+
+def test_empty():
+    ring = RingBuffer(4)
+    assert ring.mean() == 0.0
+    assert ring.median() == 0.0
+    assert ring.slope() == 0.0
+
+
+def test_partly_filled():
+    ring = fill([3, 1, 2], 8)
+    assert ring.mean() == pytest.approx(2.0)
+    assert ring.median() == 2
+    assert ring.slope() == pytest.approx(-0.5)
+
+
+def test_even_median():
+    assert fill([4, 1, 3, 2], 4).median() == 2.5
+
+
+def test_window_after_wrapping():
+    values = [5, 9, 2, 7, 7, 1, 8, 3, 6, 4, 10]
+    ring = fill(values, 4)
+    window = values[-4:]
+    assert ring.mean() == pytest.approx(statistics.mean(window))
+    assert ring.median() == statistics.median(window)
+    assert ring.slope() == pytest.approx(statistics.linear_regression(range(4), window).slope)
+
+
+def test_slope_of_a_line():
+    ring = fill([10 + 3 * i for i in range(100)], 16)
+    assert ring.slope() == pytest.approx(3.0)
+    assert ring.mean() == pytest.approx(10 + 3 * (84 + 99) / 2)
+
+
+def test_failed_read_marks_the_sensor_unavailable():
+    from src import Simulation
+    from src.Clock import clock, VirtualClock
+    from src.Hardware import PressureSensor
+
+    clock.use(VirtualClock())
+    Simulation.reset_machine()
+    sensor = PressureSensor(channel=1, sps=10)
+    reads = []
+
+    def get_last_result():
+        reads.append(1)
+        if len(reads) > 3:
+            raise OSError(121, "Remote I/O error")
+        return 1000
+
+    sensor.adc.get_last_result = get_last_result
+    sensor.start_sampling()
+    assert sensor.available
+    clock.sleep(1.0)
+    assert not sensor.available
+    assert sensor.samples.written == 3
+    sensor.stop_sampling()